@@ -1,24 +1,36 @@
 #!/usr/bin/env python3
 import sys
-import json
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import dumps
 from config import storage_dir
 
 from datasets import load_dataset
 
 dest = storage_dir("arxiv")
 ds = load_dataset("ccdv/arxiv-summarization", split="train", streaming=True)
+
+# Rows are accumulated here and handed to the file in ~64 KB writes
+WRITE_CHUNK = 1 << 16
+
 count = 0
-with open(dest / "arxiv_abstracts.jsonl", "w") as f:
+buf = bytearray()
+with open(dest / "arxiv_abstracts.jsonl", "wb", buffering=1 << 20) as f:
     for row in ds:
-        json.dump({
+        buf += dumps({
             "id": count,
             "abstract": row.get("abstract", ""),
             "article": row.get("article", "")
-        }, f)
-        f.write("\n")
+        })
+        buf += b"\n"
+        if len(buf) >= WRITE_CHUNK:
+            f.write(buf)
+            buf.clear()
         count += 1
-        if count % 10000 == 0:
+        if count % 100000 == 0:
             print(f"  {count} papers...")
+            f.write(buf)
+            buf.clear()
+            f.flush()  # bound data loss on crash
+    f.write(buf)
 print(f"Done: {count} papers")
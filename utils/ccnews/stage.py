@@ -15,18 +15,25 @@ Usage:
     python stage.py --year 2024                # Download full year
     python stage.py --index-only               # Download path indexes only
     python stage.py --limit 5                  # Download only N WARCs per month
+    python stage.py --months 2024/01 --parallel 16  # 16 concurrent downloads
 """
 
 import argparse
 import gzip
+import io
+import json
 import logging
 import re
-import subprocess
 import sys
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import conditional_headers, human_size, save_validators
 from config import storage_dir, log_dir
 
 CC_BASE = "https://data.commoncrawl.org/"
@@ -34,8 +41,28 @@ CC_NEWS_BASE = CC_BASE + "crawl-data/CC-NEWS/"
 STORAGE_DIR = storage_dir("ccnews")
 INDEX_DIR = STORAGE_DIR / "indexes"
 WARC_DIR = STORAGE_DIR / "warcs"
+MONTHS_CACHE = INDEX_DIR / "months.json"
 LOG_DIR = log_dir()
 
+# Month discovery is ~100 HEAD probes; run them concurrently over one pool
+PROBE_WORKERS = 32
+# WARCs are ~1GB; 1 MiB reads/writes keep syscall counts low
+CHUNK_SIZE = 1 << 20
+
+
+def _make_adapter(pool_size: int) -> HTTPAdapter:
+    """HTTPS adapter with `pool_size` keep-alive connections and retries."""
+    return HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]),
+    )
+
+
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "corpus-data-stager/1.0"})
+SESSION.mount("https://", _make_adapter(PROBE_WORKERS))
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -53,90 +80,136 @@ def discover_months() -> list[str]:
     CC-News HTML index pages don't reliably list subdirectories,
     and S3 ListObjects is blocked. We probe each year/month directly.
     CC-News runs from 2016/08 to present.
+
+    Results are cached in MONTHS_CACHE; later runs only re-probe from the
+    last month seen as current onwards, since older months never change.
     """
     import datetime
 
-    log.info("Probing available months (2016/08 to present)...")
-    months = []
     now = datetime.date.today()
+    known, probed_through = [], ""
+    if MONTHS_CACHE.exists():
+        cached = json.loads(MONTHS_CACHE.read_text())
+        known, probed_through = cached["months"], cached["probed_through"]
 
+    candidates = []
     for year in range(2016, now.year + 1):
         start_month = 8 if year == 2016 else 1
         end_month = now.month if year == now.year else 12
         for month in range(start_month, end_month + 1):
             ym = f"{year}/{month:02d}"
-            url = CC_NEWS_BASE + ym + "/warc.paths.gz"
-            try:
-                req = urllib.request.Request(url, method="HEAD",
-                                             headers={"User-Agent": "corpus-data-stager/1.0"})
-                with urllib.request.urlopen(req) as resp:
-                    if resp.status == 200:
-                        months.append(ym)
-            except Exception:
-                pass
+            if ym >= probed_through:
+                candidates.append(ym)
+
+    log.info("Probing %d month(s) from %s to present...", len(candidates), candidates[0])
+    months = set(m for m in known if m < probed_through)
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as ex:
+        futures = [ex.submit(_probe_month, ym) for ym in candidates]
+        for fut in as_completed(futures):
+            ym = fut.result()
+            if ym:
+                months.add(ym)
+    months = sorted(months)
+
+    MONTHS_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    MONTHS_CACHE.write_text(json.dumps({"months": months, "probed_through": candidates[-1]}))
     log.info("Found %d available months", len(months))
     return months
 
 
+def _probe_month(year_month: str) -> str | None:
+    """HEAD the month's warc.paths.gz; return year_month if it exists."""
+    url = CC_NEWS_BASE + year_month + "/warc.paths.gz"
+    try:
+        resp = SESSION.head(url, allow_redirects=True, timeout=30)
+    except requests.RequestException:
+        return None
+    return year_month if resp.status_code == 200 else None
+
+
 def fetch_warc_paths(year_month: str) -> list[str]:
-    """Download and parse the warc.paths.gz index for a given month."""
+    """Download and parse the warc.paths.gz index for a given month.
+
+    The cached copy is revalidated with If-None-Match / If-Modified-Since,
+    so unchanged (historical) months cost a header-only 304.
+    """
     index_file = INDEX_DIR / year_month.replace("/", "-") / "warc.paths"
-    if index_file.exists():
-        return index_file.read_text().strip().split("\n")
+    headers = conditional_headers(index_file)
 
     url = CC_NEWS_BASE + year_month + "/warc.paths.gz"
     log.info("Fetching WARC index: %s", url)
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": "corpus-data-stager/1.0"})
-        with urllib.request.urlopen(req) as resp:
-            data = gzip.decompress(resp.read()).decode("utf-8").strip()
+        with SESSION.get(url, headers=headers, stream=True, timeout=60) as resp:
+            if resp.status_code == 304:
+                log.info("WARC index for %s not modified, using cache", year_month)
+                return index_file.read_text().strip().split("\n")
+            resp.raise_for_status()
+            # Inflate while reading off the socket instead of buffering the whole body
+            with io.TextIOWrapper(gzip.GzipFile(fileobj=resp.raw), encoding="utf-8") as lines:
+                paths = [line.rstrip() for line in lines if line.strip()]
         index_file.parent.mkdir(parents=True, exist_ok=True)
-        index_file.write_text(data)
-        paths = data.split("\n")
+        index_file.write_text("\n".join(paths))
+        save_validators(index_file, resp.headers)
         log.info("Found %d WARCs for %s", len(paths), year_month)
         return paths
     except Exception as e:
+        if index_file.exists():
+            log.warning("Failed to revalidate index for %s, using cache: %s", year_month, e)
+            return index_file.read_text().strip().split("\n")
         log.error("Failed to fetch index for %s: %s", year_month, e)
         return []
 
 
-def download_warc(warc_path: str) -> Path | None:
-    """Download a single WARC file. warc_path is relative to CC_BASE."""
-    filename = Path(warc_path).name
-    # Organize by year/month
-    parts = warc_path.split("/")  # crawl-data/CC-NEWS/yyyy/mm/filename
-    year_month = f"{parts[2]}/{parts[3]}" if len(parts) >= 5 else "unknown"
-    dest_dir = WARC_DIR / year_month
-    dest_dir.mkdir(parents=True, exist_ok=True)
+def download_warc(warc_path: str, dest_dir: Path) -> Path | None:
+    """Download a single WARC file into dest_dir. warc_path is relative to CC_BASE.
+
+    A partial file left by an interrupted run is resumed with a Range request
+    (guarded by If-Range on the ETag, so a rotated file is re-fetched whole).
+    The finished file must match the server's Content-Length.
+    """
+    filename = warc_path.rsplit("/", 1)[-1]
     dest = dest_dir / filename
+    url = CC_BASE + warc_path
 
-    if dest.exists():
-        log.info("Already exists, skipping: %s", filename)
-        return dest
+    try:
+        head = SESSION.head(url, allow_redirects=True, timeout=60)
+        head.raise_for_status()
+        expected = int(head.headers["Content-Length"])
+        have = dest.stat().st_size if dest.exists() else 0
+        if have == expected:
+            log.info("Already exists, skipping: %s", filename)
+            return dest
+
+        headers = {}
+        if 0 < have < expected:
+            headers["Range"] = f"bytes={have}-"
+            if head.headers.get("ETag"):
+                headers["If-Range"] = head.headers["ETag"]
+            log.info("Resuming %s at %s", filename, human_size(have))
+        else:
+            log.info("Downloading %s", filename)
+
+        with SESSION.get(url, headers=headers, stream=True, timeout=60) as resp:
+            resp.raise_for_status()
+            mode = "ab" if resp.status_code == 206 else "wb"
+            with open(dest, mode, buffering=CHUNK_SIZE) as f:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+    except (requests.RequestException, OSError, KeyError, ValueError) as e:
+        # Keep any partial file; the next run resumes from it
+        log.error("Failed to download %s: %s", filename, e)
+        return None
 
-    url = CC_BASE + warc_path
-    log.info("Downloading %s", filename)
-    result = subprocess.run(
-        ["curl", "-L", "-o", str(dest), "--progress-bar", url],
-        check=False,
-    )
-    if result.returncode != 0:
-        log.error("Failed to download %s", filename)
+    actual = dest.stat().st_size
+    if actual != expected:
+        log.error("Size mismatch for %s: expected %d, got %d", filename, expected, actual)
         dest.unlink(missing_ok=True)
         return None
 
-    log.info("Downloaded %s (%s)", filename, _human_size(dest.stat().st_size))
+    log.info("Downloaded %s (%s)", filename, human_size(actual))
     return dest
 
 
-def _human_size(nbytes: int) -> str:
-    for unit in ("B", "KB", "MB", "GB", "TB"):
-        if nbytes < 1024:
-            return f"{nbytes:.1f} {unit}"
-        nbytes /= 1024
-    return f"{nbytes:.1f} PB"
-
-
 def main():
     parser = argparse.ArgumentParser(description="CC-NEWS WARC downloader")
     parser.add_argument("--list-months", action="store_true", help="List available year/months")
@@ -144,9 +217,14 @@ def main():
     parser.add_argument("--year", help="Download all months for a year (e.g. 2024)")
     parser.add_argument("--index-only", action="store_true", help="Only download warc.paths indexes")
     parser.add_argument("--limit", type=int, help="Limit WARCs downloaded per month")
+    parser.add_argument("--parallel", type=int, default=8,
+                        help="Number of concurrent WARC downloads (default: 8)")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be downloaded")
     args = parser.parse_args()
 
+    if args.parallel > PROBE_WORKERS:
+        SESSION.mount("https://", _make_adapter(args.parallel))
+
     LOG_DIR.mkdir(parents=True, exist_ok=True)
     STORAGE_DIR.mkdir(parents=True, exist_ok=True)
     INDEX_DIR.mkdir(parents=True, exist_ok=True)
@@ -185,12 +263,18 @@ def main():
 
         if args.dry_run:
             for p in download_paths:
-                print(f"Would download: {Path(p).name}")
+                print(f"Would download: {p.rsplit('/', 1)[-1]}")
             continue
 
-        for warc_path in download_paths:
-            if download_warc(warc_path):
-                total_downloaded += 1
+        # Every WARC in a month's index lives under the same yyyy/mm directory
+        dest_dir = WARC_DIR / month
+        dest_dir.mkdir(parents=True, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=args.parallel) as ex:
+            futures = [ex.submit(download_warc, p, dest_dir) for p in download_paths]
+            for fut in as_completed(futures):
+                if fut.result():
+                    total_downloaded += 1
 
     log.info("Done. Total WARCs indexed: %d, Downloaded: %d", total_warcs, total_downloaded)
 
@@ -0,0 +1,431 @@
+"""Small helpers shared by the corpus stagers."""
+
+import codecs
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Callable, Iterator, Mapping
+
+from config import log_dir
+
+# JSON bytes in and out: orjson when installed, else a stdlib fallback with
+# the same compact separators and raw UTF-8 (no \u escapes). Output can still
+# differ by backend in float formatting.
+try:
+    from orjson import dumps, loads
+except ImportError:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    loads = json.loads
+
+# page_text backends: selectolax when installed, else BeautifulSoup with
+# lxml (a C parser several times faster than the stdlib html.parser) if present
+try:
+    from selectolax.parser import HTMLParser as _SelectolaxParser
+except ImportError:
+    _SelectolaxParser = None
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB", "PB")
+
+# Read/write size when streaming a download to disk
+COPY_CHUNK = 1 << 20
+
+# Bytes fed to the HTML parser per read when streaming a listing page
+LISTING_CHUNK = 1 << 16
+
+# Directory listings kept for conditional refetches (under the log dir)
+LISTING_CACHE = "listings"
+
+# ranged_download: smallest byte range worth its own connection
+RANGE_PART_MIN = 4 << 20
+
+# ranged_download(resume=True): sidecar next to dest.part recording how far
+# each range got, rewritten at most every RANGE_STATE_INTERVAL seconds
+RANGE_STATE_SUFFIX = ".ranges"
+RANGE_STATE_INTERVAL = 10
+
+# Remote listings and other slow lookups, shared by every stager
+CACHE_DB = "stage_cache.db"
+_cache_local = threading.local()
+
+
+def human_size(nbytes: int) -> str:
+    """Format a byte count with a binary (1024-based) unit, e.g. "1.5 GB"."""
+    nbytes = int(nbytes)
+    i = min(max(0, (nbytes.bit_length() - 1) // 10), len(_SIZE_UNITS) - 1)
+    return f"{nbytes / (1 << i * 10):.1f} {_SIZE_UNITS[i]}"
+
+
+class RateLimiter:
+    """Spaces acquisitions at least 1/rate seconds apart, across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def page_text(html) -> str:
+    """Plain text of an HTML page (selectolax when installed, else BeautifulSoup).
+
+    Takes the raw response bytes: both parsers read the page's own charset
+    declaration, which avoids requests' chardet pass over the whole body
+    when `.text` is used.
+    """
+    if _SelectolaxParser is not None:
+        return _SelectolaxParser(html).text()
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, HTML_PARSER).get_text()
+
+
+def stream_download(session, url: str, dest: Path, timeout: float | tuple = 60,
+                    hasher=None, headers: Mapping[str, str] | None = None) -> int:
+    """Stream url into dest over a pooled requests session. Returns bytes written.
+
+    The body is written as sent (no Content-Encoding decoding) to dest.part,
+    which is renamed over dest only once the whole body has arrived, so dest
+    existing always means a complete download. If hasher (a hashlib object)
+    is given, every chunk is fed to it on the way to disk, so the file never
+    has to be read back to checksum it. headers are added to the request.
+    Raises on connection or HTTP errors, after removing dest.part.
+    """
+    part = dest.with_name(dest.name + ".part")
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=timeout) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = False  # on-disk bytes must match upstream checksums
+            with open(part, "wb") as f:
+                if hasher is None:
+                    shutil.copyfileobj(resp.raw, f, COPY_CHUNK)
+                else:
+                    for chunk in iter(lambda: resp.raw.read(COPY_CHUNK), b""):
+                        hasher.update(chunk)
+                        f.write(chunk)
+                size = f.tell()
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    os.replace(part, dest)
+    return size
+
+
+def _pwrite_all(fd: int, data, offset: int) -> int:
+    view = memoryview(data)
+    while view:
+        n = os.pwrite(fd, view, offset)
+        view, offset = view[n:], offset + n
+    return offset
+
+
+def ranged_download(session, url: str, dest: Path, parts: int, timeout: float | tuple = 60,
+                    hasher=None, headers: Mapping[str, str] | None = None,
+                    resume: bool = False) -> int:
+    """Download url over `parts` concurrent HTTP Range requests. Returns bytes written.
+
+    Each range is written with os.pwrite into its own region of a
+    preallocated dest.part, which is renamed over dest once every range has
+    landed. A single connection is often capped by per-flow congestion
+    control well below what the origin can serve, so large files gain close
+    to linearly. Falls back to stream_download when the server rejects the
+    HEAD, doesn't advertise byte ranges or the file is too small to split.
+    headers are added to every request. A hasher is fed
+    the finished file from the still-cached pages before the rename. Raises
+    like stream_download, likewise removing dest.part.
+
+    With resume, a failed download instead keeps dest.part and a
+    dest.part.ranges sidecar with each range's progress, and the next call
+    for the same size re-requests only the missing bytes. (Nothing is kept
+    when it falls back to stream_download, as there are no ranges to resume.)
+    """
+    headers = dict(headers or {})
+    head = session.head(url, headers=headers, timeout=timeout, allow_redirects=True)
+    size = int(head.headers.get("Content-Length") or 0)
+    if (parts < 2 or not head.ok or size < parts * RANGE_PART_MIN
+            or head.headers.get("Accept-Ranges", "").lower() != "bytes"):
+        return stream_download(session, url, dest, timeout, hasher, headers)
+
+    step = -(-size // parts)
+    part = dest.with_name(dest.name + ".part")
+    state_path = part.with_name(part.name + RANGE_STATE_SUFFIX)
+    # Range start -> first byte not yet written; only advanced after a pwrite
+    progress = {lo: lo for lo in range(0, size, step)}
+    if resume and part.exists():
+        try:
+            state = json.loads(state_path.read_text())
+            if state["size"] == size and state["step"] == step:
+                progress.update((int(lo), done) for lo, done in state["done"].items())
+        except (FileNotFoundError, KeyError, ValueError):
+            pass
+    resuming = any(done > lo for lo, done in progress.items())
+    state_lock = threading.Lock()
+    saved_at = [time.monotonic()]
+
+    def save_state():
+        tmp = state_path.with_name(state_path.name + ".tmp")
+        tmp.write_text(json.dumps({"size": size, "step": step, "done": progress}))
+        os.replace(tmp, state_path)
+
+    def fetch_range(lo: int):
+        hi = min(lo + step, size) - 1
+        offset = progress[lo]
+        if offset > hi:
+            return
+        with session.get(url, headers={**headers, "Range": f"bytes={offset}-{hi}"},
+                         stream=True, timeout=timeout) as resp:
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                raise OSError(f"server ignored Range for {url}")
+            resp.raw.decode_content = False
+            for chunk in iter(lambda: resp.raw.read(COPY_CHUNK), b""):
+                offset = progress[lo] = _pwrite_all(fd, chunk, offset)
+                if resume and time.monotonic() - saved_at[0] >= RANGE_STATE_INTERVAL:
+                    with state_lock:
+                        if time.monotonic() - saved_at[0] >= RANGE_STATE_INTERVAL:
+                            save_state()
+                            saved_at[0] = time.monotonic()
+        if offset != hi + 1:
+            raise OSError(f"short range {lo}-{hi} for {url}: ended at {offset}")
+
+    fd = os.open(part, os.O_RDWR | os.O_CREAT | (0 if resuming else os.O_TRUNC), 0o644)
+    try:
+        if resume:
+            # Before the preallocation: a full-size dest.part with no sidecar
+            # must never be mistaken for a finished download
+            save_state()
+        os.ftruncate(fd, size)
+        with ThreadPoolExecutor(max_workers=parts) as pool:
+            for future in [pool.submit(fetch_range, lo) for lo in progress]:
+                future.result()
+        if hasher is not None:
+            os.lseek(fd, 0, os.SEEK_SET)
+            for chunk in iter(lambda: os.read(fd, COPY_CHUNK), b""):
+                hasher.update(chunk)
+    except BaseException:
+        os.close(fd)
+        if resume:
+            with state_lock:
+                save_state()
+        else:
+            part.unlink(missing_ok=True)
+        raise
+    os.close(fd)
+    state_path.unlink(missing_ok=True)
+    os.replace(part, dest)
+    return size
+
+
+class _HrefParser(HTMLParser):
+    def __init__(self, match: Callable[[str], bool]):
+        super().__init__()
+        self.match = match
+        self.hrefs: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            for name, value in attrs:
+                if name == "href" and value and self.match(value):
+                    self.hrefs.append(value)
+
+
+def stream_hrefs(resp, match: Callable[[str], bool]) -> list[str]:
+    """<a href> values on an HTML listing for which match(href) is true.
+
+    resp is any binary file-like (e.g. a urlopen response); it is parsed in
+    chunks as it arrives, so the page is never held whole in memory.
+    """
+    parser = _HrefParser(match)
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    for chunk in iter(lambda: resp.read(LISTING_CHUNK), b""):
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.hrefs
+
+
+class _ListingTee:
+    """Reads a listing response while copying it into the cache.
+
+    The copy only replaces the cached page (and its validators) once the
+    body has been read to the end, so an interrupted read never leaves a
+    truncated page that a later 304 would vouch for.
+    """
+
+    def __init__(self, resp, path: Path):
+        self.resp = resp
+        self.path = path
+        self.part = path.with_name(path.name + ".part")
+        self.f = open(self.part, "wb")
+
+    def read(self, n: int = -1) -> bytes:
+        data = self.resp.read(n)
+        self.f.write(data)
+        if (not data or n < 0) and not self.f.closed:
+            self.f.close()
+            os.replace(self.part, self.path)
+            save_validators(self.path, self.resp.headers)
+        return data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.resp.close()
+        if not self.f.closed:
+            self.f.close()
+            self.part.unlink(missing_ok=True)
+
+
+def open_listing(url: str, headers: Mapping[str, str] | None = None):
+    """Open an HTML directory listing, revalidated against a cached copy.
+
+    Returns a binary file-like usable as a context manager. The last body
+    is kept under the log dir with its ETag/Last-Modified; later calls send
+    a conditional request and read the cached copy on 304. A fresh body is
+    cached as the caller reads it, so it can still be parsed incrementally.
+    """
+    path = log_dir() / LISTING_CACHE / (hashlib.sha1(url.encode()).hexdigest() + ".html")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    req = urllib.request.Request(url, headers={**(headers or {}), **conditional_headers(path)})
+    try:
+        return _ListingTee(urllib.request.urlopen(req), path)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return open(path, "rb")
+        raise
+
+
+def iter_files(root, exts: tuple[str, ...]) -> Iterator[str]:
+    """Yield paths of files under root whose names end with any of exts (one scandir walk)."""
+    stack = [os.fspath(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(exts):
+                    yield entry.path
+
+
+def existing_names(directory) -> set[str]:
+    """Names of the entries in directory (empty if it doesn't exist).
+
+    One readdir instead of a stat per candidate file, which matters for
+    large download lists and on network filesystems.
+    """
+    try:
+        with os.scandir(directory) as it:
+            return {entry.name for entry in it}
+    except FileNotFoundError:
+        return set()
+
+
+def drop_page_cache(path):
+    """Tell the kernel a written file won't be read again soon (POSIX_FADV_DONTNEED).
+
+    Keeps bulk downloads from pushing other workloads' pages out of the page
+    cache. The kernel only drops clean pages, so the file is fdatasync'd
+    first; a just-written file would otherwise keep nearly all of them.
+    No-op where posix_fadvise is unavailable.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fdatasync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _cache_conn() -> sqlite3.Connection:
+    """Per-thread connection to the cache database (sqlite connections can't be shared)."""
+    conn = getattr(_cache_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(log_dir() / CACHE_DB, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache "
+                     "(key TEXT PRIMARY KEY, ts INTEGER, data BLOB)")
+        _cache_local.conn = conn
+    return conn
+
+
+def get_or_fetch(key: str, fetch_fn: Callable[[], Any], ttl: float | None = 86400,
+                 refresh: bool = False) -> Any:
+    """Return the cached JSON-serializable value for key, or call fetch_fn and store it.
+
+    Entries older than ttl seconds are refetched (ttl=None keeps them forever,
+    for keys that already encode a version). refresh forces a fetch.
+    """
+    conn = _cache_conn()
+    if not refresh:
+        row = conn.execute("SELECT ts, data FROM cache WHERE key = ?", (key,)).fetchone()
+        if row and (ttl is None or time.time() - row[0] < ttl):
+            return loads(row[1])
+
+    value = fetch_fn()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                     (key, int(time.time()), dumps(value)))
+    return value
+
+
+def _meta_path(path: Path) -> Path:
+    return path.with_name(path.name + ".meta.json")
+
+
+def conditional_headers(path: Path) -> dict:
+    """If-None-Match/If-Modified-Since headers for revalidating a downloaded file.
+
+    Uses the validators saved by save_validators(), falling back to the
+    file's mtime. Empty if the file doesn't exist.
+    """
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return {}
+    try:
+        meta = json.loads(_meta_path(path).read_text())
+    except (FileNotFoundError, ValueError):
+        meta = {}
+    headers = {"If-Modified-Since": meta.get("last_modified") or formatdate(mtime, usegmt=True)}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    return headers
+
+
+def save_validators(path: Path, response_headers: Mapping[str, str]):
+    """Store a response's ETag/Last-Modified next to the file it was saved to."""
+    _meta_path(path).write_text(json.dumps({
+        "etag": response_headers.get("ETag"),
+        "last_modified": response_headers.get("Last-Modified"),
+    }))
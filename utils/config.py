@@ -5,24 +5,51 @@ All paths default to relative locations under the repository root.
 """
 
 import configparser
+import functools
 import os
 from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
 
 # Repository root = parent of utils/
 REPO_ROOT = Path(__file__).resolve().parent.parent
 
 
+_env_loaded = False
+
+
 def _load_env():
-    """Load .env file into environment (does not overwrite existing vars)."""
+    """Load .env file into environment (does not overwrite existing vars).
+
+    Uses python-dotenv when installed, otherwise a minimal KEY=VALUE parser.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
     env_file = REPO_ROOT / ".env"
-    if env_file.exists():
-        for line in env_file.read_text().splitlines():
-            line = line.strip()
-            if line and not line.startswith("#") and "=" in line:
-                key, _, val = line.partition("=")
-                key, val = key.strip(), val.strip()
-                if key and key not in os.environ:
-                    os.environ[key] = val
+    if not env_file.exists():
+        return
+    if load_dotenv is not None:
+        load_dotenv(env_file, override=False)
+    else:
+        _load_env_fallback(env_file)
+
+
+def _load_env_fallback(env_file: Path):
+    """Parse simple KEY=VALUE lines from .env (no quoting or interpolation)."""
+    for line in env_file.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#") and "=" in line:
+            key, _, val = line.partition("=")
+            key, val = key.strip(), val.strip()
+            if key and key not in os.environ:
+                os.environ[key] = val
 
 
 def _resolve_path(p: str) -> Path:
@@ -67,29 +94,35 @@ def get_config() -> configparser.ConfigParser:
     return _config
 
 
+@functools.lru_cache(maxsize=None)
 def storage_dir(source: str = "") -> Path:
-    """Get storage directory, optionally for a specific source. Creates it."""
+    """Get storage directory, optionally for a specific source. Creates it (once per process)."""
     base = _resolve_path(get_config()["paths"]["storage_dir"])
     p = base / source if source else base
     p.mkdir(parents=True, exist_ok=True)
     return p
 
 
+@functools.lru_cache(maxsize=None)
 def log_dir() -> Path:
-    """Get log directory. Creates it."""
+    """Get log directory. Creates it (once per process)."""
     p = _resolve_path(get_config()["paths"]["log_dir"])
     p.mkdir(parents=True, exist_ok=True)
     return p
 
 
-def postgres_config() -> dict:
-    """Get postgres connection config with password from .env."""
+@functools.lru_cache(maxsize=1)
+def postgres_config() -> Mapping:
+    """Get postgres connection config with password from .env.
+
+    Cached and read-only; use dict(postgres_config()) for a mutable copy.
+    """
     cfg = get_config()["postgres"]
-    return {
+    return MappingProxyType({
         "host": cfg["host"],
         "port": int(cfg["port"]),
         "database": cfg["database"],
         "user": cfg["user"],
         "password": os.environ.get("POSTGRES_PASSWORD", ""),
         "sslmode": cfg.get("sslmode", "require"),
-    }
+    })
@@ -1,18 +1,31 @@
 #!/usr/bin/env python3
 """Download NY court opinions from CourtListener API"""
 import requests
-import json
-import time
+from requests.adapters import HTTPAdapter
+import gzip
+import queue
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import RateLimiter, dumps
 from config import storage_dir
 
 BASE_URL = "https://www.courtlistener.com/api/rest/v4"
 OUTPUT_DIR = storage_dir("courtlistener") / "api"
 API_TOKEN = os.getenv("COURTLISTENER_TOKEN", "")
 
+# Opinions per {court}-{shard}.jsonl.gz file
+SHARD_SIZE = 10000
+# Pages buffered between the fetch loop and the shard writer
+WRITE_QUEUE_PAGES = 10
+# Courts are independent, so they are crawled concurrently
+COURT_WORKERS = 6
+
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=16))
+
 # NY Court identifiers from CourtListener
 NY_COURTS = [
     "ny",           # NY Court of Appeals
@@ -23,6 +36,55 @@ NY_COURTS = [
     "nyfamct",      # NY Family Court
 ]
 
+# Shared by every court's page fetches: 60 requests a minute
+RATE_LIMIT = RateLimiter(1.0)
+
+def _fetch(url, params, headers):
+    """Rate-limited GET returning the decoded JSON page."""
+    RATE_LIMIT.acquire()
+    resp = SESSION.get(url, params=params, headers=headers, timeout=30)
+    resp.raise_for_status()
+    return resp.json()
+
+def _write_shards(court_id, output_dir, pages):
+    """Drain pages of opinions from a queue into gzip JSONL shards until a None sentinel.
+
+    Returns the number of opinions written.
+    """
+    shard_file = None
+    written = 0
+    
+    try:
+        for page in iter(pages.get, None):
+            lines = [dumps(opinion) + b"\n" for opinion in page]
+            while lines:
+                if written % SHARD_SIZE == 0:
+                    if shard_file:
+                        shard_file.close()
+                    shard_path = output_dir / f"{court_id}-{written // SHARD_SIZE:05d}.jsonl.gz"
+                    # Level 1: staging favours write speed over ratio
+                    shard_file = gzip.open(shard_path, "wb", compresslevel=1)
+                room = SHARD_SIZE - written % SHARD_SIZE
+                batch, lines = lines[:room], lines[room:]
+                shard_file.write(b"".join(batch))
+                written += len(batch)
+    finally:
+        if shard_file:
+            shard_file.close()
+    return written
+
+def _put(pages, item, writer):
+    """Queue item for the writer, raising the writer's error instead of blocking if it has died."""
+    while True:
+        if writer.done():
+            writer.result()
+            raise RuntimeError("shard writer exited before the end of the crawl")
+        try:
+            pages.put(item, timeout=1)
+            return
+        except queue.Full:
+            pass
+
 def download_opinions(court_id, output_dir):
     """Download all opinions for a court"""
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -40,35 +102,46 @@ def download_opinions(court_id, output_dir):
     headers = {"Authorization": f"Token {API_TOKEN}"}
     
     page = 1
-    total = 0
+    pages = queue.Queue(maxsize=WRITE_QUEUE_PAGES)
+    # A future rather than a bare thread, so a write error (disk full, gzip)
+    # reaches the fetch loop instead of leaving put() blocked forever
+    writer_pool = ThreadPoolExecutor(max_workers=1)
+    writer = writer_pool.submit(_write_shards, court_id, output_dir, pages)
     
-    while url:
-        print(f"\n{court_id} - Page {page}")
-        
-        try:
-            resp = requests.get(url, params=params if page == 1 else None, headers=headers, timeout=30)
-            resp.raise_for_status()
-            data = resp.json()
-            
-            results = data.get("results", [])
-            print(f"  Got {len(results)} opinions")
+    # One-slot prefetch: the next page's request is in flight while this
+    # page is filtered and queued (put() blocks when the writer falls behind).
+    # The cursor URL is only known once a page is decoded, so this is as
+    # far ahead as the API allows; _fetch still goes through RATE_LIMIT.
+    prefetch = ThreadPoolExecutor(max_workers=1)
+    next_page = prefetch.submit(_fetch, url, params, headers)
+    
+    try:
+        while next_page:
+            print(f"\n{court_id} - Page {page}")
             
-            for opinion in results:
-                opinion_id = opinion.get("id")
-                if opinion_id:
-                    filename = output_dir / f"{court_id}_{opinion_id}.json"
-                    with open(filename, "w") as f:
-                        json.dump(opinion, f, indent=2)
-                    total += 1
+            try:
+                data = next_page.result()
+            except Exception as e:
+                print(f"  Error: {e}")
+                break
             
             url = data.get("next")
-            page += 1
-            time.sleep(1)  # Rate limiting
+            next_page = prefetch.submit(_fetch, url, None, headers) if url else None
+            
+            results = [o for o in data.get("results", []) if o.get("id")]
+            print(f"  Got {len(results)} opinions")
             
-        except Exception as e:
-            print(f"  Error: {e}")
-            break
+            # Hand the page to the writer and go straight to the next fetch
+            _put(pages, results, writer)
+            page += 1
+    finally:
+        prefetch.shutdown(wait=True, cancel_futures=True)
+        if not writer.done():
+            _put(pages, None, writer)
+        writer_pool.shutdown(wait=True)
     
+    # Only what the writer actually flushed to shards counts
+    total = writer.result()
     print(f"\nTotal downloaded for {court_id}: {total}")
     return total
 
@@ -77,11 +150,13 @@ def main():
     print("=" * 50)
     
     grand_total = 0
-    for court in NY_COURTS:
-        print(f"\nDownloading {court}...")
-        output_dir = OUTPUT_DIR / court
-        count = download_opinions(court, output_dir)
-        grand_total += count
+    with ThreadPoolExecutor(max_workers=COURT_WORKERS) as executor:
+        futures = {}
+        for court in NY_COURTS:
+            print(f"\nDownloading {court}...")
+            futures[executor.submit(download_opinions, court, OUTPUT_DIR / court)] = court
+        for future in as_completed(futures):
+            grand_total += future.result()
     
     print(f"\n{'=' * 50}")
     print(f"Grand total: {grand_total} opinions")
@@ -10,7 +10,7 @@ from config import postgres_config
 
 DB_CONFIG = postgres_config()
 
-SCHEMA_SQL = """
+SCHEMA_TABLES_SQL = """
 -- Courts table
 CREATE TABLE IF NOT EXISTS courts (
     id VARCHAR(15) PRIMARY KEY,
@@ -32,7 +32,7 @@ CREATE TABLE IF NOT EXISTS courts (
     end_date DATE,
     jurisdiction VARCHAR(10),
     notes TEXT,
-    parent_court_id VARCHAR(15) REFERENCES courts(id)
+    parent_court_id VARCHAR(15)
 );
 
 -- Dockets table
@@ -77,9 +77,9 @@ CREATE TABLE IF NOT EXISTS dockets (
     view_count INTEGER,
     date_blocked DATE,
     blocked BOOLEAN,
-    appeal_from_id VARCHAR(15) REFERENCES courts(id),
+    appeal_from_id VARCHAR(15),
     assigned_to_id BIGINT,
-    court_id VARCHAR(15) REFERENCES courts(id),
+    court_id VARCHAR(15),
     idb_data_id BIGINT,
     originating_court_information_id BIGINT,
     referred_to_id BIGINT,
@@ -88,7 +88,7 @@ CREATE TABLE IF NOT EXISTS dockets (
     federal_dn_judge_initials_assigned VARCHAR(50),
     federal_dn_judge_initials_referred VARCHAR(50),
     federal_defendant_number INTEGER,
-    parent_docket_id BIGINT REFERENCES dockets(id)
+    parent_docket_id BIGINT
 );
 
 -- Opinion Clusters table
@@ -126,7 +126,7 @@ CREATE TABLE IF NOT EXISTS opinion_clusters (
     blocked BOOLEAN,
     filepath_json_harvard TEXT,
     filepath_pdf_harvard TEXT,
-    docket_id BIGINT REFERENCES dockets(id),
+    docket_id BIGINT,
     arguments TEXT,
     headmatter TEXT
 );
@@ -153,29 +153,93 @@ CREATE TABLE IF NOT EXISTS opinions (
     html_with_citations TEXT,
     extracted_by_ocr BOOLEAN,
     author_id BIGINT,
-    cluster_id BIGINT REFERENCES opinion_clusters(id)
+    cluster_id BIGINT
 );
 
 -- Citation map table
 CREATE TABLE IF NOT EXISTS citation_map (
     id BIGINT PRIMARY KEY,
     depth INTEGER,
-    cited_opinion_id BIGINT REFERENCES opinions(id),
-    citing_opinion_id BIGINT REFERENCES opinions(id)
+    cited_opinion_id BIGINT,
+    citing_opinion_id BIGINT
 );
+"""
+
+# Foreign keys and secondary indexes are kept separate from the tables so the
+# bulk import can drop them, COPY into bare heaps, and rebuild them once.
+SCHEMA_CONSTRAINTS_SQL = """
+-- Foreign keys
+ALTER TABLE courts DROP CONSTRAINT IF EXISTS fk_parent_court,
+    ADD CONSTRAINT fk_parent_court FOREIGN KEY (parent_court_id) REFERENCES courts(id);
+ALTER TABLE dockets DROP CONSTRAINT IF EXISTS fk_dockets_court,
+    ADD CONSTRAINT fk_dockets_court FOREIGN KEY (court_id) REFERENCES courts(id);
+ALTER TABLE dockets DROP CONSTRAINT IF EXISTS fk_dockets_appeal_from,
+    ADD CONSTRAINT fk_dockets_appeal_from FOREIGN KEY (appeal_from_id) REFERENCES courts(id);
+ALTER TABLE dockets DROP CONSTRAINT IF EXISTS fk_dockets_parent,
+    ADD CONSTRAINT fk_dockets_parent FOREIGN KEY (parent_docket_id) REFERENCES dockets(id);
+ALTER TABLE opinion_clusters DROP CONSTRAINT IF EXISTS fk_clusters_docket,
+    ADD CONSTRAINT fk_clusters_docket FOREIGN KEY (docket_id) REFERENCES dockets(id);
+ALTER TABLE opinions DROP CONSTRAINT IF EXISTS fk_opinions_cluster,
+    ADD CONSTRAINT fk_opinions_cluster FOREIGN KEY (cluster_id) REFERENCES opinion_clusters(id);
+ALTER TABLE citation_map DROP CONSTRAINT IF EXISTS fk_citations_cited,
+    ADD CONSTRAINT fk_citations_cited FOREIGN KEY (cited_opinion_id) REFERENCES opinions(id);
+ALTER TABLE citation_map DROP CONSTRAINT IF EXISTS fk_citations_citing,
+    ADD CONSTRAINT fk_citations_citing FOREIGN KEY (citing_opinion_id) REFERENCES opinions(id);
 
--- Create indexes
+-- Indexes (the docket, cluster and cited-opinion lookups use covering
+-- indexes for the join/aggregate queries in sample.py; they also serve
+-- plain lookups on their leading column, so the old plain ones are dropped)
+DROP INDEX IF EXISTS idx_opinion_clusters_docket;
+DROP INDEX IF EXISTS idx_opinions_cluster;
+DROP INDEX IF EXISTS idx_citation_map_cited;
 CREATE INDEX IF NOT EXISTS idx_dockets_court ON dockets(court_id);
 CREATE INDEX IF NOT EXISTS idx_dockets_date_filed ON dockets(date_filed);
 CREATE INDEX IF NOT EXISTS idx_dockets_case_name ON dockets(case_name);
-CREATE INDEX IF NOT EXISTS idx_opinion_clusters_docket ON opinion_clusters(docket_id);
+CREATE INDEX IF NOT EXISTS idx_opinion_clusters_docket_filed ON opinion_clusters(docket_id, date_filed);
 CREATE INDEX IF NOT EXISTS idx_opinion_clusters_date_filed ON opinion_clusters(date_filed);
-CREATE INDEX IF NOT EXISTS idx_opinions_cluster ON opinions(cluster_id);
+CREATE INDEX IF NOT EXISTS idx_opinions_cluster_covering ON opinions(cluster_id) INCLUDE (id);
 CREATE INDEX IF NOT EXISTS idx_opinions_sha1 ON opinions(sha1);
-CREATE INDEX IF NOT EXISTS idx_citation_map_cited ON citation_map(cited_opinion_id);
+CREATE INDEX IF NOT EXISTS idx_citation_map_cited_covering ON citation_map(cited_opinion_id) INCLUDE (citing_opinion_id);
 CREATE INDEX IF NOT EXISTS idx_citation_map_citing ON citation_map(citing_opinion_id);
 """
 
+# Every foreign key on these tables is dropped by catalog lookup, not by
+# name, so databases created by the older schema (inline REFERENCES, with
+# auto-named *_fkey constraints) are stripped too
+SCHEMA_DROP_CONSTRAINTS_SQL = """
+DO $$
+DECLARE
+    fk record;
+BEGIN
+    FOR fk IN
+        SELECT conrelid::regclass AS tbl, conname FROM pg_constraint
+        WHERE contype = 'f'
+          AND conrelid IN ('courts'::regclass, 'dockets'::regclass, 'opinion_clusters'::regclass,
+                           'opinions'::regclass, 'citation_map'::regclass)
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', fk.tbl, fk.conname);
+    END LOOP;
+END $$;
+
+-- idx_opinion_clusters_docket, idx_opinions_cluster and idx_citation_map_cited
+-- are no longer built (superseded by the covering indexes) but are still
+-- dropped for databases created before that
+DROP INDEX IF EXISTS idx_dockets_court;
+DROP INDEX IF EXISTS idx_dockets_date_filed;
+DROP INDEX IF EXISTS idx_dockets_case_name;
+DROP INDEX IF EXISTS idx_opinion_clusters_docket;
+DROP INDEX IF EXISTS idx_opinion_clusters_date_filed;
+DROP INDEX IF EXISTS idx_opinions_cluster;
+DROP INDEX IF EXISTS idx_opinions_sha1;
+DROP INDEX IF EXISTS idx_citation_map_cited;
+DROP INDEX IF EXISTS idx_citation_map_citing;
+DROP INDEX IF EXISTS idx_citation_map_cited_covering;
+DROP INDEX IF EXISTS idx_opinions_cluster_covering;
+DROP INDEX IF EXISTS idx_opinion_clusters_docket_filed;
+"""
+
+SCHEMA_SQL = SCHEMA_TABLES_SQL + SCHEMA_CONSTRAINTS_SQL
+
 def create_database():
     """Create the database if it doesn't exist."""
     conn = psycopg2.connect(
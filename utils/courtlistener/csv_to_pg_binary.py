@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Convert CourtListener bulk CSVs to PostgreSQL binary COPY files.
+
+Run once after downloading; import_data.py then loads the .bin files with
+COPY ... (FORMAT BINARY), which skips all per-row text parsing in the backend.
+Column order and types are taken from the CREATE TABLE statements in
+create_schema.py, so the output matches the table layout exactly.
+
+Note: Python's csv module cannot tell a quoted empty string from an unquoted
+one, so every empty field is written as NULL (COPY CSV would keep `` as '').
+
+Usage:
+    python csv_to_pg_binary.py                  # Convert all five tables
+    python csv_to_pg_binary.py opinions         # Convert specific tables
+"""
+
+import csv
+import os
+import re
+import struct
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from create_schema import SCHEMA_TABLES_SQL
+from import_data import DATA_DIR, FILES
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+NULL_FIELD = struct.pack(">i", -1)
+
+PG_EPOCH_DATE = date(2000, 1, 1)
+PG_EPOCH = datetime(2000, 1, 1)
+
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def _bool(value):
+    return b"\x01" if value.lower() in ("t", "true", "1", "y", "yes") else b"\x00"
+
+
+def _date(value):
+    return struct.pack(">i", (date.fromisoformat(value[:10]) - PG_EPOCH_DATE).days)
+
+
+def _timestamp(value):
+    # TIMESTAMP (without time zone) ignores any offset, as COPY CSV does
+    dt = datetime.fromisoformat(value).replace(tzinfo=None)
+    delta = dt - PG_EPOCH
+    return struct.pack(">q", (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds)
+
+
+def _numeric(value):
+    """Encode as NUMERIC: base-10000 digit groups with weight, sign and scale."""
+    sign, digits, exponent = Decimal(value).as_tuple()
+    text = "".join(map(str, digits))
+    if exponent >= 0:
+        int_part, frac_part = text + "0" * exponent, ""
+    else:
+        text = text.rjust(-exponent, "0")
+        int_part, frac_part = text[:exponent], text[exponent:]
+    int_part = int_part.rjust(-(-len(int_part) // 4) * 4, "0")
+    frac_part = frac_part.ljust(-(-len(frac_part) // 4) * 4, "0")
+
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+
+    dscale = max(0, -exponent)
+    header = struct.pack(">hhHh", len(groups), weight, 0x4000 if sign else 0, dscale)
+    return header + struct.pack(f">{len(groups)}h", *groups)
+
+
+ENCODERS = {
+    "BIGINT": lambda v: struct.pack(">q", int(v)),
+    "INTEGER": lambda v: struct.pack(">i", int(v)),
+    "SMALLINT": lambda v: struct.pack(">h", int(v)),
+    "BOOLEAN": _bool,
+    "DATE": _date,
+    "TIMESTAMP": _timestamp,
+    "NUMERIC": _numeric,
+    "VARCHAR": lambda v: v.encode("utf-8"),
+    "TEXT": lambda v: v.encode("utf-8"),
+}
+
+
+def table_columns(table_name):
+    """Return [(column, type)] for a table, in CREATE TABLE order."""
+    match = re.search(rf"CREATE TABLE IF NOT EXISTS {table_name} \((.*?)\n\);", SCHEMA_TABLES_SQL, re.S)
+    if not match:
+        raise ValueError(f"No CREATE TABLE for {table_name} in create_schema.py")
+    return re.findall(r"^\s+(\w+) ([A-Z]+)", match.group(1), re.M)
+
+
+def convert(table_name, csv_path, bin_path):
+    """Stream one CSV into a binary COPY file. Returns the row count.
+
+    Rows go to <bin>.part, renamed over bin_path only once the trailer is
+    written: binary COPY takes EOF at a row boundary as end of data, so a
+    cut-off file would otherwise load as a silently truncated table.
+    """
+    columns = table_columns(table_name)
+    field_count = struct.pack(">h", len(columns))
+    rows = 0
+    part_path = bin_path.with_name(bin_path.name + ".part")
+
+    with open(csv_path, newline="", encoding="utf-8") as src, \
+            open(part_path, "wb", buffering=WRITE_BUFFER_SIZE) as out:
+        reader = csv.reader(src, quotechar="`")
+        header = next(reader)
+        positions = {name: i for i, name in enumerate(header)}
+        plan = [(positions.get(name), ENCODERS[pg_type]) for name, pg_type in columns]
+
+        out.write(PGCOPY_HEADER)
+        for row in reader:
+            parts = [field_count]
+            for pos, encode in plan:
+                value = row[pos] if pos is not None else ""
+                if value == "":
+                    parts.append(NULL_FIELD)
+                else:
+                    data = encode(value)
+                    parts.append(struct.pack(">i", len(data)))
+                    parts.append(data)
+            out.write(b"".join(parts))
+            rows += 1
+            if rows % 1_000_000 == 0:
+                print(f"  {rows:,} rows...")
+        out.write(PGCOPY_TRAILER)
+
+    os.replace(part_path, bin_path)
+    return rows
+
+
+def main():
+    csv.field_size_limit(sys.maxsize)
+    tables = sys.argv[1:] or list(FILES)
+
+    for table_name in tables:
+        csv_path = DATA_DIR / FILES[table_name]
+        bin_path = csv_path.with_suffix(".bin")
+        if not csv_path.exists():
+            print(f"✗ File not found: {csv_path}")
+            continue
+        print(f"\nConverting {csv_path.name} -> {bin_path.name}")
+        try:
+            rows = convert(table_name, csv_path, bin_path)
+        except BaseException:
+            bin_path.with_name(bin_path.name + ".part").unlink(missing_ok=True)
+            raise
+        print(f"✓ Wrote {rows:,} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,15 +4,26 @@
 import csv
 import psycopg2
 from psycopg2 import sql
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from config import postgres_config, storage_dir
+from create_schema import SCHEMA_TABLES_SQL, SCHEMA_CONSTRAINTS_SQL, SCHEMA_DROP_CONSTRAINTS_SQL
+
+try:
+    # ISA-L inflate is 2-3x faster than zlib; same API as gzip.open
+    from isal.igzip import open as gzip_open
+except ImportError:
+    from gzip import open as gzip_open
 
 DB_CONFIG = postgres_config()
 DATA_DIR = storage_dir("courtlistener") / "bulk"
 
+# COPY is byte-oriented; feed it raw bytes in 1 MiB reads
+COPY_BUFFER_SIZE = 1 << 20
+
 FILES = {
     'courts': 'courts-2024-12-31.csv',
     'dockets': 'dockets-2024-12-31.csv',
@@ -21,31 +32,78 @@ FILES = {
     'citation_map': 'citation-map-2024-12-31.csv'
 }
 
+# Loaded first, in order, over the main connection
+SERIAL_TABLES = ['courts', 'dockets']
+# With FKs dropped these have no ordering between them; each gets its own connection
+PARALLEL_TABLES = ['opinion_clusters', 'opinions', 'citation_map']
+
+COPY_CSV_SQL = "COPY {} FROM STDIN WITH (FORMAT CSV, HEADER TRUE, QUOTE '`', NULL '')"
+COPY_BINARY_SQL = "COPY {} FROM STDIN WITH (FORMAT BINARY)"
+
+# Raised for the duration of the load so the 50GB of COPY + SET LOGGED
+# doesn't trigger a checkpoint every max_wal_size (default 1GB)
+WAL_SETTINGS = {
+    'max_wal_size': '32GB',
+    'checkpoint_timeout': '30min',
+}
+
+def open_copy_source(path):
+    """Open a COPY input for binary reads, inflating .gz on the fly."""
+    if path.suffix == '.gz':
+        return gzip_open(path, 'rb')
+    return open(path, 'rb', buffering=COPY_BUFFER_SIZE)
+
+def _is_stale(bin_path, *sources):
+    """True if any existing source file is newer than bin_path."""
+    built = bin_path.stat().st_mtime
+    return any(p.exists() and p.stat().st_mtime > built for p in sources)
+
+
 def import_csv(conn, table_name, csv_file, batch_size=10000):
-    """Import CSV file into PostgreSQL table using COPY."""
-    print(f"\nImporting {csv_file} into {table_name}...")
-    
+    """Import CSV file into PostgreSQL table using COPY.
+
+    The table is switched to UNLOGGED, loaded, and switched back to LOGGED
+    in one transaction, so its WAL is written once in bulk at the end.
+
+    If csv_to_pg_binary.py has produced a .bin next to the CSV, that is
+    loaded with FORMAT BINARY instead, skipping server-side text parsing.
+    If only the .csv.gz is present it is decompressed in-process straight
+    into COPY, with no intermediate file. A .bin older than the CSV it was
+    converted from is stale and ignored.
+    """
     csv_path = DATA_DIR / csv_file
-    if not csv_path.exists():
-        print(f"File not found: {csv_path}")
+    bin_path = csv_path.with_suffix('.bin')
+    gz_path = csv_path.with_name(csv_path.name + '.gz')
+    if bin_path.exists() and not _is_stale(bin_path, csv_path, gz_path):
+        src_path, copy_sql = bin_path, COPY_BINARY_SQL
+    elif gz_path.exists() and not csv_path.exists():
+        src_path, copy_sql = gz_path, COPY_CSV_SQL
+    else:
+        src_path, copy_sql = csv_path, COPY_CSV_SQL
+    print(f"\nImporting {src_path.name} into {table_name}...")
+    
+    if not src_path.exists():
+        print(f"File not found: {src_path}")
         return
     
     cur = conn.cursor()
     
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            # Use PostgreSQL's COPY command with backtick quotes
+        table = sql.Identifier(table_name)
+        cur.execute(sql.SQL("ALTER TABLE {} SET UNLOGGED").format(table))
+        with open_copy_source(src_path) as f:
             cur.copy_expert(
-                sql.SQL("COPY {} FROM STDIN WITH (FORMAT CSV, HEADER TRUE, QUOTE '`', NULL '')").format(
-                    sql.Identifier(table_name)
-                ),
-                f
+                sql.SQL(copy_sql).format(sql.Identifier(table_name)),
+                f,
+                size=COPY_BUFFER_SIZE
             )
-        conn.commit()
+        cur.execute(sql.SQL("ALTER TABLE {} SET LOGGED").format(table))
         
-        # Get row count
+        # Get row count (before the commit, so the connection isn't left
+        # idle in a transaction the count opened)
         cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table_name)))
         count = cur.fetchone()[0]
+        conn.commit()
         print(f"Imported {count:,} rows into {table_name}")
         
     except Exception as e:
@@ -55,19 +113,127 @@ def import_csv(conn, table_name, csv_file, batch_size=10000):
     finally:
         cur.close()
 
+def prepare_bulk_load(conn):
+    """Create bare tables and drop FKs/indexes so COPY only writes heap rows."""
+    print("\nPreparing tables for bulk load...")
+    cur = conn.cursor()
+    
+    try:
+        cur.execute(SCHEMA_TABLES_SQL)
+        cur.execute(SCHEMA_DROP_CONSTRAINTS_SQL)
+        # Session settings: skip WAL flush waits, give index builds more memory
+        cur.execute("SET synchronous_commit = off")
+        cur.execute("SET maintenance_work_mem = '4GB'")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error preparing tables: {e}")
+        raise
+    finally:
+        cur.close()
+
+def finish_bulk_load(conn):
+    """Rebuild foreign keys and indexes, then ANALYZE."""
+    print("\nRebuilding constraints and indexes...")
+    cur = conn.cursor()
+    
+    try:
+        cur.execute(SCHEMA_CONSTRAINTS_SQL)
+        # Fresh statistics so the planner doesn't assume empty tables
+        for table_name in FILES:
+            cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table_name)))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error rebuilding constraints: {e}")
+        raise
+    finally:
+        cur.close()
+
+def set_wal_settings(restore=None):
+    """Raise checkpoint limits server-wide for the bulk load, or put them back.
+
+    Returns what postgresql.auto.conf held for each setting beforehand (None
+    where it had no entry); pass that back as restore= after the load. Prior
+    values are set again and only settings without one are RESET, so anything
+    an operator set with ALTER SYSTEM survives. Returns None if the settings
+    couldn't be changed.
+
+    ALTER SYSTEM needs superuser and can't run inside a transaction, so this
+    uses its own short-lived autocommit connection (whatever state the load's
+    connections are in) and just warns if the role isn't allowed to.
+    """
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cur = conn.cursor()
+    prior = None
+    
+    try:
+        if restore is None:
+            # Later lines of the file win, hence the ordering
+            cur.execute(
+                "SELECT name, setting FROM pg_file_settings"
+                " WHERE name = ANY(%s) AND sourcefile LIKE %s ORDER BY seqno",
+                (list(WAL_SETTINGS), '%/postgresql.auto.conf'),
+            )
+            prior = dict.fromkeys(WAL_SETTINGS)
+            prior.update(cur.fetchall())
+        for name, value in (WAL_SETTINGS if restore is None else restore).items():
+            if value is None:
+                cur.execute(sql.SQL("ALTER SYSTEM RESET {}").format(sql.Identifier(name)))
+            else:
+                cur.execute(sql.SQL("ALTER SYSTEM SET {} = %s").format(sql.Identifier(name)), (value,))
+        cur.execute("SELECT pg_reload_conf()")
+    except psycopg2.Error as e:
+        print(f"Skipping WAL settings ({e.pgcode}): {str(e).strip()}")
+        prior = None
+    finally:
+        cur.close()
+        conn.close()
+    return prior
+
+def import_csv_own_connection(table_name, csv_file):
+    """Import one CSV over a dedicated connection (for parallel COPY streams)."""
+    conn = psycopg2.connect(**DB_CONFIG)
+    
+    try:
+        cur = conn.cursor()
+        cur.execute("SET synchronous_commit = off")
+        cur.close()
+        import_csv(conn, table_name, csv_file)
+    finally:
+        conn.close()
+
 def main():
     """Import all CSV files."""
-    conn = psycopg2.connect(**DB_CONFIG)
+    prior_wal = set_wal_settings()
+    conn = None
     
     try:
-        # Import in order to respect foreign key constraints
-        for table_name, csv_file in FILES.items():
-            import_csv(conn, table_name, csv_file)
+        conn = psycopg2.connect(**DB_CONFIG)
+        prepare_bulk_load(conn)
+        
+        for table_name in SERIAL_TABLES:
+            import_csv(conn, table_name, FILES[table_name])
+        
+        # psycopg2 releases the GIL during COPY I/O, so threads run truly parallel
+        with ThreadPoolExecutor(max_workers=len(PARALLEL_TABLES)) as executor:
+            futures = [
+                executor.submit(import_csv_own_connection, table_name, FILES[table_name])
+                for table_name in PARALLEL_TABLES
+            ]
+            for future in futures:
+                future.result()
+        
+        finish_bulk_load(conn)
         
         print("\n✓ All data imported successfully!")
         
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+        if prior_wal is not None:
+            set_wal_settings(restore=prior_wal)
 
 if __name__ == '__main__':
     main()
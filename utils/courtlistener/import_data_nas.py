@@ -8,9 +8,18 @@ import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from config import postgres_config, storage_dir
 
+try:
+    # ISA-L inflate is 2-3x faster than zlib; same API as gzip.open
+    from isal.igzip import open as gzip_open
+except ImportError:
+    from gzip import open as gzip_open
+
 DB_CONFIG = postgres_config()
 DATA_DIR = storage_dir("courtlistener") / "bulk"
 
+# COPY is byte-oriented; feed it raw bytes in 1 MiB reads
+COPY_BUFFER_SIZE = 1 << 20
+
 FILES = {
     'courts': 'courts-2024-12-31.csv',
     'dockets': 'dockets-2024-12-31.csv',
@@ -22,6 +31,10 @@ FILES = {
 def import_csv(conn, table_name, csv_file):
     """Import CSV with progress."""
     csv_path = DATA_DIR / csv_file
+    gz_path = csv_path.with_name(csv_path.name + '.gz')
+    if not csv_path.exists() and gz_path.exists():
+        # Stream-decompress instead of inflating to disk first
+        csv_path, csv_file = gz_path, gz_path.name
     if not csv_path.exists():
         print(f"✗ File not found: {csv_path}")
         return
@@ -35,12 +48,17 @@ def import_csv(conn, table_name, csv_file):
     cur = conn.cursor()
     
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
+        if csv_path.suffix == '.gz':
+            f = gzip_open(csv_path, 'rb')
+        else:
+            f = open(csv_path, 'rb', buffering=COPY_BUFFER_SIZE)
+        with f:
             cur.copy_expert(
                 sql.SQL("COPY {} FROM STDIN WITH (FORMAT CSV, HEADER TRUE, QUOTE '`', NULL '')").format(
                     sql.Identifier(table_name)
                 ),
-                f
+                f,
+                size=COPY_BUFFER_SIZE
             )
         conn.commit()
         
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """Verify database schema and show table information."""
 
+import argparse
 import psycopg2
+from psycopg2 import sql
 from pathlib import Path
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -9,41 +11,47 @@ from config import postgres_config
 
 DB_CONFIG = postgres_config()
 
-def verify_schema():
-    """Verify the schema and show table info."""
+# One round trip for every table: planner row estimate plus live column count
+TABLES_SQL = """
+    SELECT 
+        c.relname,
+        c.reltuples::bigint,
+        COUNT(a.attnum)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    GROUP BY c.oid, c.relname, c.reltuples
+    ORDER BY c.relname
+"""
+
+def verify_schema(exact=False):
+    """Verify the schema and show table info.
+
+    Row counts are the planner's estimates (pg_class.reltuples) unless exact
+    is set, which runs COUNT(*) on every table.
+    """
     try:
         conn = psycopg2.connect(**DB_CONFIG)
         cur = conn.cursor()
         
         print("✓ Connected to database successfully\n")
         
-        # List all tables
-        cur.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            ORDER BY table_name
-        """)
+        cur.execute(TABLES_SQL)
         tables = cur.fetchall()
         
         if tables:
             print(f"Found {len(tables)} tables:")
-            for table in tables:
-                table_name = table[0]
-                
-                # Get row count
-                cur.execute(f"SELECT COUNT(*) FROM {table_name}")
-                count = cur.fetchone()[0]
-                
-                # Get column count
-                cur.execute(f"""
-                    SELECT COUNT(*) 
-                    FROM information_schema.columns 
-                    WHERE table_name = '{table_name}'
-                """)
-                col_count = cur.fetchone()[0]
+            for table_name, estimate, col_count in tables:
+                if exact:
+                    cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table_name)))
+                    rows = f"{cur.fetchone()[0]:,} rows"
+                elif estimate < 0:
+                    rows = "unknown rows (not yet analyzed)"
+                else:
+                    rows = f"~{estimate:,} rows"
                 
-                print(f"  - {table_name}: {count:,} rows, {col_count} columns")
+                print(f"  - {table_name}: {rows}, {col_count} columns")
         else:
             print("No tables found. Run create_schema.py first.")
         
@@ -56,4 +64,8 @@ def verify_schema():
         print(f"✗ Error: {e}")
 
 if __name__ == '__main__':
-    verify_schema()
+    parser = argparse.ArgumentParser(description="Verify CourtListener schema")
+    parser.add_argument("--exact", action="store_true",
+                        help="Exact row counts via COUNT(*) (slow on large tables)")
+    args = parser.parse_args()
+    verify_schema(exact=args.exact)
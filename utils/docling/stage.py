@@ -16,12 +16,20 @@ Usage:
     python stage.py --dataset all           # Download everything
     python stage.py --dataset doclaynet --split test  # Only test split
     python stage.py --extract-pdfs          # Extract individual PDF files from parquet
+    python stage.py --dataset doclaynet --extract-pdfs --shard-format tar
+                                            # Pack PDFs into 10k-file tar shards instead
+    python stage.py --read-shard PATH       # List the PDFs in a tar shard
 """
 
 import argparse
+import io
+import json
 import logging
 import os
 import sys
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -49,6 +57,24 @@ DATASETS = {
     },
 }
 
+# Concurrent parquet downloads from the HuggingFace CDN
+DOWNLOAD_WORKERS = 8
+
+# Rows per Arrow batch when extracting. Each row holds a whole PDF (DP-Bench
+# documents run to several MB), so batches stay small to bound memory.
+EXTRACT_BATCH_SIZE = 256
+
+# PDF writes are handed to a thread pool so decoding the next batch overlaps
+# disk I/O; the semaphore caps how many payloads sit queued in memory.
+PDF_WRITE_WORKERS = 16
+PDF_WRITES_IN_FLIGHT = 64
+
+# Path separators in document IDs become underscores in filenames
+_SAFE = str.maketrans("/\\", "__")
+
+# PDFs per tar shard with --shard-format tar (WebDataset-style)
+TAR_SHARD_SIZE = 10000
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -62,7 +88,7 @@ log = logging.getLogger(__name__)
 
 def download_parquets(repo_id: str, dest_dir: Path, split: str | None = None) -> list[Path]:
     """Download parquet files from a HuggingFace dataset repo."""
-    from huggingface_hub import HfApi, hf_hub_download
+    from huggingface_hub import HfApi, snapshot_download
 
     token = os.environ.get("HF_TOKEN")
     api = HfApi(token=token)
@@ -82,25 +108,67 @@ def download_parquets(repo_id: str, dest_dir: Path, split: str | None = None) ->
 
     log.info("Found %d parquet files to download", len(parquets))
 
-    downloaded = []
-    for i, pq_path in enumerate(parquets):
-        dest = dest_dir / pq_path
-        if dest.exists():
-            log.info("[%d/%d] Already exists: %s", i + 1, len(parquets), pq_path)
-            downloaded.append(dest)
-            continue
+    missing = [p for p in parquets if not (dest_dir / p).exists()]
+    if len(missing) < len(parquets):
+        log.info("%d of %d already downloaded", len(parquets) - len(missing), len(parquets))
 
-        log.info("[%d/%d] Downloading %s", i + 1, len(parquets), pq_path)
-        local = hf_hub_download(
+    if missing:
+        # Exact repo paths as allow_patterns; files are fetched concurrently
+        log.info("Downloading %d parquet files (%d at a time)", len(missing), DOWNLOAD_WORKERS)
+        snapshot_download(
             repo_id=repo_id,
-            filename=pq_path,
             repo_type="dataset",
+            allow_patterns=missing,
             token=token,
             local_dir=str(dest_dir),
+            max_workers=DOWNLOAD_WORKERS,
         )
-        downloaded.append(Path(local))
 
-    return downloaded
+    return [dest_dir / p for p in parquets]
+
+
+def _binary_views(arr) -> list:
+    """Per-row memoryviews into a binary Arrow array's data buffer (None for nulls).
+
+    Slices point straight into Arrow memory, so PDF payloads are written to
+    disk without first being copied into Python bytes objects.
+    """
+    import pyarrow as pa
+
+    if pa.types.is_large_binary(arr.type):
+        offset_format = "q"
+    elif pa.types.is_binary(arr.type):
+        offset_format = "i"
+    else:
+        return arr.to_pylist()
+    if len(arr) == 0:
+        return []
+
+    _, offsets, data = arr.buffers()
+    offsets = memoryview(offsets).cast(offset_format)[arr.offset:arr.offset + len(arr) + 1]
+    data = memoryview(data) if data is not None else memoryview(b"")
+    nulls = arr.is_null().to_pylist() if arr.null_count else None
+    return [
+        None if nulls and nulls[i] else data[offsets[i]:offsets[i + 1]]
+        for i in range(len(arr))
+    ]
+
+
+def _write_pdf(dest: Path, pdf_bytes: bytes | memoryview, slots: threading.BoundedSemaphore):
+    """Write one PDF with raw os.write calls, then free its in-flight slot."""
+    try:
+        fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(pdf_bytes)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+    except OSError as e:
+        log.warning("Failed to write %s: %s", dest, e)
+        dest.unlink(missing_ok=True)
+    finally:
+        slots.release()
 
 
 def extract_pdfs_dpbench(parquet_files: list[Path], output_dir: Path) -> int:
@@ -109,66 +177,97 @@ def extract_pdfs_dpbench(parquet_files: list[Path], output_dir: Path) -> int:
 
     output_dir.mkdir(parents=True, exist_ok=True)
     count = 0
+    slots = threading.BoundedSemaphore(PDF_WRITES_IN_FLIGHT)
+    # One directory listing instead of a stat() per PDF on resumed runs
+    existing = {e.name for e in os.scandir(output_dir)}
 
-    for pf in parquet_files:
-        log.info("Extracting PDFs from %s", pf.name)
-        table = pq.read_table(str(pf), columns=["BinaryDocument", "document_id"])
+    with ThreadPoolExecutor(max_workers=PDF_WRITE_WORKERS) as pool:
+        for pf in parquet_files:
+            log.info("Extracting PDFs from %s", pf.name)
+            batches = pq.ParquetFile(str(pf)).iter_batches(
+                batch_size=EXTRACT_BATCH_SIZE, columns=["BinaryDocument", "document_id"])
 
-        for i in range(len(table)):
-            pdf_bytes = table["BinaryDocument"][i].as_py()
-            doc_id = table["document_id"][i].as_py()
+            for batch in batches:
+                # One bulk conversion per column instead of .as_py() per cell
+                pdfs = _binary_views(batch.column("BinaryDocument"))
+                doc_ids = batch.column("document_id").to_pylist()
 
-            # Clean up doc_id for filename
-            safe_name = doc_id.replace("/", "_").replace("\\", "_")
-            if not safe_name.endswith(".pdf"):
-                safe_name += ".pdf"
+                for pdf_bytes, doc_id in zip(pdfs, doc_ids):
+                    if not pdf_bytes:
+                        continue
 
-            dest = output_dir / safe_name
-            if dest.exists():
-                continue
+                    # Clean up doc_id for filename
+                    safe_name = doc_id.translate(_SAFE)
+                    if not safe_name.endswith(".pdf"):
+                        safe_name += ".pdf"
 
-            with open(dest, "wb") as f:
-                f.write(pdf_bytes)
-            count += 1
+                    if safe_name in existing:
+                        continue
+                    existing.add(safe_name)
+
+                    slots.acquire()
+                    dest = output_dir / safe_name
+                    pool.submit(_write_pdf, dest, pdf_bytes, slots)
+                    count += 1
 
-        log.info("Extracted %d PDFs so far", count)
+            log.info("Extracted %d PDFs so far", count)
 
     return count
 
 
-def extract_pdfs_doclaynet(parquet_files: list[Path], output_dir: Path) -> int:
-    """Extract PDFs from DocLayNet-v1.2 parquet (pdf column + metadata)."""
+def _iter_doclaynet_pdfs(parquet_files: list[Path]):
+    """Yield (pdf_bytes, page_hash, doc_category) for every non-empty DocLayNet row."""
     import pyarrow.parquet as pq
 
-    output_dir.mkdir(parents=True, exist_ok=True)
-    count = 0
-
+    row = 0
     for pf in parquet_files:
         log.info("Extracting PDFs from %s", pf.name)
-        table = pq.read_table(str(pf), columns=["pdf", "metadata"])
+        # Dotted paths project struct leaves, so the other metadata fields
+        # (original_filename, page_no, ...) are never read or decompressed
+        batches = pq.ParquetFile(str(pf)).iter_batches(
+            batch_size=EXTRACT_BATCH_SIZE,
+            columns=["pdf", "metadata.page_hash", "metadata.doc_category"])
+
+        for batch in batches:
+            pdfs = _binary_views(batch.column("pdf"))
+            # Split the struct into typed child arrays once per batch
+            meta = batch.column("metadata")
+            fields = dict(zip((f.name for f in meta.type), meta.flatten()))
+            page_hashes = fields["page_hash"].to_pylist()
+            doc_cats = fields["doc_category"].to_pylist()
+
+            for pdf_bytes, page_hash, doc_cat in zip(pdfs, page_hashes, doc_cats):
+                row += 1
+                if not pdf_bytes:
+                    continue
+                yield pdf_bytes, page_hash or f"unknown_{row:06d}", doc_cat or "unknown"
 
-        for i in range(len(table)):
-            pdf_bytes = table["pdf"][i].as_py()
-            if not pdf_bytes:
-                continue
 
-            meta = table["metadata"][i].as_py()
-            page_hash = meta.get("page_hash", f"unknown_{count:06d}")
-            doc_cat = meta.get("doc_category", "unknown")
-            orig_file = meta.get("original_filename", "")
-            page_no = meta.get("page_no", 0)
+def extract_pdfs_doclaynet(parquet_files: list[Path], output_dir: Path) -> int:
+    """Extract PDFs from DocLayNet-v1.2 parquet (pdf column + metadata)."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    count = 0
+    slots = threading.BoundedSemaphore(PDF_WRITES_IN_FLIGHT)
+    # doc_category -> filenames already on disk, listed once per category
+    cat_seen: dict[str, set[str]] = {}
 
+    with ThreadPoolExecutor(max_workers=PDF_WRITE_WORKERS) as pool:
+        for pdf_bytes, page_hash, doc_cat in _iter_doclaynet_pdfs(parquet_files):
             # Organize by category
             cat_dir = output_dir / doc_cat
-            cat_dir.mkdir(parents=True, exist_ok=True)
+            seen = cat_seen.get(doc_cat)
+            if seen is None:
+                cat_dir.mkdir(parents=True, exist_ok=True)
+                seen = cat_seen[doc_cat] = {e.name for e in os.scandir(cat_dir)}
 
             filename = f"{page_hash}.pdf"
-            dest = cat_dir / filename
-            if dest.exists():
+            if filename in seen:
                 continue
+            seen.add(filename)
 
-            with open(dest, "wb") as f:
-                f.write(pdf_bytes)
+            slots.acquire()
+            dest = cat_dir / filename
+            pool.submit(_write_pdf, dest, pdf_bytes, slots)
             count += 1
 
             if count % 5000 == 0:
@@ -177,6 +276,67 @@ def extract_pdfs_doclaynet(parquet_files: list[Path], output_dir: Path) -> int:
     return count
 
 
+def _close_shard(tar: tarfile.TarFile, members: list[str], index: dict, index_path: Path):
+    """Close a finished shard and record its members in the sidecar index."""
+    tar.close()
+    index[Path(tar.name).name] = members
+    tmp = index_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(index))
+    tmp.replace(index_path)
+
+
+def extract_pdfs_doclaynet_tar(parquet_files: list[Path], output_dir: Path,
+                               shard_size: int = TAR_SHARD_SIZE) -> int:
+    """Pack DocLayNet PDFs into doclaynet-NNNNN.tar shards of shard_size files.
+
+    Members are named {doc_category}/{page_hash}.pdf. shards.json maps each
+    shard to its members, and a resumed run skips anything already packed.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    index_path = output_dir / "shards.json"
+    index = json.loads(index_path.read_text()) if index_path.exists() else {}
+    packed = {name for members in index.values() for name in members}
+
+    count = 0
+    tar = None
+    members = []
+    try:
+        for pdf_bytes, page_hash, doc_cat in _iter_doclaynet_pdfs(parquet_files):
+            name = f"{doc_cat}/{page_hash}.pdf"
+            if name in packed:
+                continue
+            packed.add(name)
+
+            if tar is None:
+                shard_path = output_dir / f"doclaynet-{len(index):05d}.tar"
+                tar = tarfile.open(shard_path, "w", bufsize=1 << 20)
+                members = []
+
+            info = tarfile.TarInfo(name)
+            info.size = len(pdf_bytes)
+            tar.addfile(info, io.BytesIO(pdf_bytes))
+            members.append(name)
+            count += 1
+
+            if len(members) >= shard_size:
+                _close_shard(tar, members, index, index_path)
+                tar = None
+                log.info("Packed %d PDFs into %d shards so far", count, len(index))
+    finally:
+        if tar is not None:
+            _close_shard(tar, members, index, index_path)
+
+    return count
+
+
+def iter_shard(shard_path: Path):
+    """Yield (member name, PDF bytes) from a shard written by --shard-format tar."""
+    with tarfile.open(shard_path, "r") as tar:
+        for member in tar:
+            if member.isfile():
+                yield member.name, tar.extractfile(member).read()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Docling PDF dataset downloader")
     parser.add_argument("--list", action="store_true", help="List available datasets")
@@ -185,12 +345,22 @@ def main():
     parser.add_argument("--split", help="Only download a specific split (train/validation/test)")
     parser.add_argument("--extract-pdfs", action="store_true",
                         help="Extract individual PDF files from parquet")
+    parser.add_argument("--shard-format", choices=["files", "tar"], default="files",
+                        help="DocLayNet output: one file per PDF, or tar shards "
+                             f"of {TAR_SHARD_SIZE:,} PDFs (default: files)")
+    parser.add_argument("--read-shard", type=Path, metavar="PATH",
+                        help="List the PDFs in a tar shard and exit")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be downloaded")
     args = parser.parse_args()
 
     LOG_DIR.mkdir(parents=True, exist_ok=True)
     STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 
+    if args.read_shard:
+        for member, data in iter_shard(args.read_shard):
+            print(f"  {len(data):>10,}  {member}")
+        return
+
     if args.list:
         for name, info in DATASETS.items():
             print(f"  {name:12s}  {info['size_gb']:6.1f} GB  {info['description']}")
@@ -227,6 +397,9 @@ def main():
             pdf_dir = dest_dir / "pdfs"
             if name == "dpbench":
                 count = extract_pdfs_dpbench(parquets, pdf_dir)
+            elif name == "doclaynet" and args.shard_format == "tar":
+                pdf_dir = dest_dir / "shards"
+                count = extract_pdfs_doclaynet_tar(parquets, pdf_dir)
             elif name == "doclaynet":
                 count = extract_pdfs_doclaynet(parquets, pdf_dir)
             else:
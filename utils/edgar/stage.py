@@ -18,16 +18,23 @@ Usage:
 """
 
 import argparse
-import json
+import gzip
+import itertools
 import logging
+import mmap
 import os
-import subprocess
+import re
 import sys
-import time
-import urllib.request
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
+from typing import Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import RateLimiter, conditional_headers, human_size, ranged_download, save_validators
 from config import storage_dir, log_dir
 
 EDGAR_BASE = "https://www.sec.gov/Archives/edgar/"
@@ -40,6 +47,24 @@ LOG_DIR = log_dir()
 # SEC requires identification
 EDGAR_IDENTITY = os.environ.get("EDGAR_IDENTITY", "CorpusData corpus@example.com")
 
+# SEC allows 10 req/s per client; all threads share one budget
+SEC_RATE = 9.0
+FILING_WORKERS = 12
+# Filing downloads queued ahead of the workers while the index is parsed
+MAX_PENDING_FILINGS = 64
+
+# Large archives are fetched as parallel byte ranges on separate connections
+RANGE_PARTS = 8
+# Daily feed archives downloaded at once (each split into FEED_RANGE_PARTS)
+FEED_WORKERS = 4
+FEED_RANGE_PARTS = 2
+
+# One master.idx data row: CIK|Company Name|Form Type|Date Filed|Filename
+INDEX_LINE_RE = re.compile(rb"^(\d+)\|([^|\n]*)\|([^|\n]*)\|(\d{4}-\d{2}-\d{2})\|(\S+)", re.M)
+# Directory listing links, matched on the raw response bytes
+YEAR_LINK_RE = re.compile(rb'href="(\d{4})/"')
+ARCHIVE_LINK_RE = re.compile(rb'href="(\d+\.nc\.tar\.gz)"')
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -51,96 +76,195 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
+RATE_LIMIT = RateLimiter(SEC_RATE)
+
+class _RateLimitedSession(requests.Session):
+    """Session that takes a RATE_LIMIT slot before every request."""
+
+    def request(self, *args, **kwargs):
+        RATE_LIMIT.acquire()
+        return super().request(*args, **kwargs)
+
+
+# Keep-alive connections shared by all download threads; every request,
+# including those made by the common download helpers, is rate-limited
+SESSION = _RateLimitedSession()
+SESSION.headers.update({"User-Agent": EDGAR_IDENTITY})
+SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+
 def _sec_request(url: str) -> bytes:
     """Make a rate-limited request to SEC with proper User-Agent."""
-    import gzip as gzmod
-    req = urllib.request.Request(url, headers={
-        "User-Agent": EDGAR_IDENTITY,
-        "Accept-Encoding": "gzip, deflate",
-    })
-    time.sleep(0.11)  # ~9 req/sec to stay under 10/sec limit
-    with urllib.request.urlopen(req) as resp:
-        data = resp.read()
-        if resp.headers.get("Content-Encoding") == "gzip" or data[:2] == b'\x1f\x8b':
-            data = gzmod.decompress(data)
-        return data
+    resp = SESSION.get(url, timeout=60)
+    resp.raise_for_status()
+    # requests already undoes Content-Encoding; this catches gzip bodies
+    data = resp.content
+    if data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    return data
 
 
 def list_available_years() -> list[int]:
     """List years available in the EDGAR full-index."""
     log.info("Fetching available years from EDGAR full-index")
-    import re
-    data = _sec_request(FULL_INDEX_BASE).decode("utf-8")
-    years = sorted(set(int(y) for y in re.findall(r'href="(\d{4})/"', data)))
+    data = _sec_request(FULL_INDEX_BASE)
+    years = sorted(set(int(y) for y in YEAR_LINK_RE.findall(data)))
     return years
 
 
+def _sec_fetch_if_changed(url: str, dest: Path) -> bool:
+    """Download url to dest unless the cached copy is still current.
+
+    Revalidates with common.conditional_headers (the validators saved next
+    to dest, or its mtime); SEC answers an unchanged file with a header-only
+    304. Returns True if dest was (re)written.
+    """
+    resp = SESSION.get(url, headers=conditional_headers(dest), timeout=60)
+    if resp.status_code == 304:
+        return False
+    resp.raise_for_status()
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".part")
+    tmp.write_bytes(resp.content)
+    tmp.replace(dest)
+    save_validators(dest, resp.headers)
+    return True
+
+
 def download_index(year: int, quarter: int) -> Path | None:
-    """Download the master.idx for a given year/quarter."""
+    """Download (or revalidate) the master.idx for a given year/quarter."""
     dest = INDEX_DIR / str(year) / f"QTR{quarter}" / "master.idx"
-    if dest.exists():
-        log.info("Index exists: %s/%d/QTR%d", year, year, quarter)
-        return dest
-
     url = f"{FULL_INDEX_BASE}{year}/QTR{quarter}/master.idx"
-    log.info("Downloading index: %s", url)
     try:
-        data = _sec_request(url)
-        dest.parent.mkdir(parents=True, exist_ok=True)
-        dest.write_bytes(data)
-        log.info("Saved index: %s (%s)", dest, _human_size(len(data)))
+        if _sec_fetch_if_changed(url, dest):
+            log.info("Saved index: %s (%s)", dest, human_size(dest.stat().st_size))
+        else:
+            log.info("Index unchanged: %d/QTR%d", year, quarter)
         return dest
     except Exception as e:
+        if dest.exists():
+            log.warning("Could not revalidate %d/QTR%d index, using cached copy: %s",
+                        year, quarter, e)
+            return dest
         log.warning("No index for %d/QTR%d: %s", year, quarter, e)
         return None
 
 
-def parse_index(index_path: Path, filing_types: list[str] | None = None) -> list[dict]:
-    """Parse a master.idx file into filing records."""
-    records = []
-    lines = index_path.read_text(errors="replace").split("\n")
-    # Skip header lines (first 11 lines typically)
-    data_started = False
-    for line in lines:
-        if line.startswith("---"):
-            data_started = True
-            continue
-        if not data_started:
-            continue
-        parts = line.split("|")
-        if len(parts) < 5:
-            continue
-        cik, company, form_type, date_filed, filename = [p.strip() for p in parts[:5]]
-        if filing_types and form_type not in filing_types:
-            continue
-        records.append({
-            "cik": cik,
-            "company": company,
-            "form_type": form_type,
-            "date_filed": date_filed,
-            "filename": filename,
-        })
-    return records
+def parse_index(index_path: Path, filing_types: list[str] | None = None) -> Iterator[dict]:
+    """Parse a master.idx file, yielding filing records lazily.
+
+    The file is memory-mapped and matched in place; only the captured fields
+    of each record are copied out and decoded.
+    """
+    wanted = {t.encode() for t in filing_types} if filing_types else None
+
+    with open(index_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # Data rows start after the dashed rule under the column header
+            rule = data.find(b"\n---")
+            if rule < 0:
+                return
+            start = data.find(b"\n", rule + 1)
+
+            for match in INDEX_LINE_RE.finditer(data, start):
+                cik, company, form_type, date_filed, filename = match.groups()
+                form_type = form_type.strip()
+                if wanted and form_type not in wanted:
+                    continue
+                yield {
+                    "cik": cik.decode(),
+                    "company": company.decode("utf-8", "replace").strip(),
+                    "form_type": form_type.decode("utf-8", "replace"),
+                    "date_filed": date_filed.decode(),
+                    "filename": filename.decode("utf-8", "replace"),
+                }
+
+
+_listing_lock = threading.Lock()
+_dir_listings: dict[Path, set[str]] = {}
+# Directories known to exist, so mkdir runs once per CIK rather than per filing
+_made_dirs: set[Path] = set()
+
+
+def _existing_names(directory: Path) -> set[str]:
+    """Names already in a directory, listed once per run and shared by threads."""
+    with _listing_lock:
+        names = _dir_listings.get(directory)
+        if names is None:
+            try:
+                names = {e.name for e in os.scandir(directory)}
+                _made_dirs.add(directory)
+            except FileNotFoundError:
+                names = set()
+            _dir_listings[directory] = names
+        return names
+
+
+def _ensure_dir(directory: Path):
+    """mkdir -p, skipped for directories already created or seen this run."""
+    if directory not in _made_dirs:
+        directory.mkdir(parents=True, exist_ok=True)
+        _made_dirs.add(directory)
 
 
 def download_filing(filename: str) -> Path | None:
     """Download a single filing from EDGAR archives."""
     # filename is like "edgar/data/1234567/0001234567-24-000001.txt"
     dest = FILINGS_DIR / filename
-    if dest.exists():
+    existing = _existing_names(dest.parent)
+    if dest.name in existing:
         return dest
 
     url = f"https://www.sec.gov/Archives/{filename}"
     try:
         data = _sec_request(url)
-        dest.parent.mkdir(parents=True, exist_ok=True)
+        _ensure_dir(dest.parent)
         dest.write_bytes(data)
+        existing.add(dest.name)
         return dest
     except Exception as e:
         log.warning("Failed to download %s: %s", filename, e)
         return None
 
 
+def download_filings(records: Iterator[dict], workers: int) -> tuple[int, int]:
+    """Download filings as records stream in. Returns (downloaded, total).
+
+    At most MAX_PENDING_FILINGS downloads are queued at once, so memory stays
+    flat however many filings the index lists.
+    """
+    downloaded = total = 0
+    pending = set()
+    # Threads overlap request latency; RATE_LIMIT keeps the total under SEC's cap
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for r in records:
+            if len(pending) >= MAX_PENDING_FILINGS:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                downloaded += sum(1 for f in done if f.result())
+            pending.add(executor.submit(download_filing, r["filename"]))
+            total += 1
+        downloaded += sum(1 for f in as_completed(pending) if f.result())
+    return downloaded, total
+
+
+def _download_file(url: str, dest: Path, parts: int = RANGE_PARTS) -> bool:
+    """Download url to dest, split into parallel byte ranges when supported.
+
+    common.ranged_download over the rate-limited SESSION, so every range
+    request still counts against SEC_RATE. Data lands in a .part file that
+    is renamed into place only once every range has arrived in full.
+    """
+    try:
+        ranged_download(SESSION, url, dest, parts, headers={"Accept-Encoding": "identity"})
+        return True
+    except Exception as e:
+        log.warning("Failed to download %s: %s", url, e)
+        return False
+
+
 def download_company_facts() -> Path | None:
     """Download the XBRL companyfacts.zip (~1GB)."""
     dest = STORAGE_DIR / "companyfacts.zip"
@@ -149,17 +273,11 @@ def download_company_facts() -> Path | None:
         return dest
 
     url = "https://www.sec.gov/Archives/edgar/daily-index/xbrl/companyfacts.zip"
-    log.info("Downloading companyfacts.zip (~1GB)")
-    result = subprocess.run(
-        ["curl", "-L", "-o", str(dest), "--progress-bar",
-         "-H", f"User-Agent: {EDGAR_IDENTITY}", url],
-        check=False,
-    )
-    if result.returncode != 0:
+    log.info("Downloading companyfacts.zip (~1GB) in %d parallel ranges", RANGE_PARTS)
+    if not _download_file(url, dest):
         log.error("Failed to download companyfacts.zip")
-        dest.unlink(missing_ok=True)
         return None
-    log.info("Downloaded companyfacts.zip (%s)", _human_size(dest.stat().st_size))
+    log.info("Downloaded companyfacts.zip (%s)", human_size(dest.stat().st_size))
     return dest
 
 
@@ -168,47 +286,35 @@ def download_daily_feed(year: int, quarter: int) -> list[Path]:
     feed_base = f"https://www.sec.gov/Archives/edgar/Feed/{year}/QTR{quarter}/"
     log.info("Fetching daily feed listing for %d/QTR%d", year, quarter)
 
-    import re
     try:
-        data = _sec_request(feed_base).decode("utf-8")
+        data = _sec_request(feed_base)
     except Exception as e:
         log.warning("No daily feed for %d/QTR%d: %s", year, quarter, e)
         return []
 
-    archives = sorted(set(re.findall(r'href="(\d+\.nc\.tar\.gz)"', data)))
+    archives = sorted(set(a.decode() for a in ARCHIVE_LINK_RE.findall(data)))
     log.info("Found %d daily feed archives for %d/QTR%d", len(archives), year, quarter)
 
     downloaded = []
     feed_dir = STORAGE_DIR / "feed" / str(year) / f"QTR{quarter}"
     feed_dir.mkdir(parents=True, exist_ok=True)
 
-    for archive in archives:
-        dest = feed_dir / archive
-        if dest.exists():
-            downloaded.append(dest)
-            continue
-
-        url = feed_base + archive
-        log.info("Downloading feed: %s", archive)
-        result = subprocess.run(
-            ["curl", "-L", "-o", str(dest), "--progress-bar",
-             "-H", f"User-Agent: {EDGAR_IDENTITY}", url],
-            check=False,
-        )
-        if result.returncode == 0:
-            downloaded.append(dest)
-        else:
-            dest.unlink(missing_ok=True)
+    futures = {}
+    with ThreadPoolExecutor(max_workers=FEED_WORKERS) as executor:
+        for archive in archives:
+            dest = feed_dir / archive
+            if dest.exists():
+                downloaded.append(dest)
+                continue
 
-    return downloaded
+            log.info("Downloading feed: %s", archive)
+            futures[executor.submit(_download_file, feed_base + archive, dest, FEED_RANGE_PARTS)] = dest
 
+        for future in as_completed(futures):
+            if future.result():
+                downloaded.append(futures[future])
 
-def _human_size(nbytes: int) -> str:
-    for unit in ("B", "KB", "MB", "GB", "TB"):
-        if nbytes < 1024:
-            return f"{nbytes:.1f} {unit}"
-        nbytes /= 1024
-    return f"{nbytes:.1f} PB"
+    return sorted(downloaded)
 
 
 def main():
@@ -221,6 +327,8 @@ def main():
     parser.add_argument("--feed", action="store_true", help="Download daily feed archives (bulk)")
     parser.add_argument("--company-facts", action="store_true", help="Download XBRL companyfacts.zip")
     parser.add_argument("--limit", type=int, help="Limit number of filings downloaded")
+    parser.add_argument("--workers", type=int, default=FILING_WORKERS,
+                        help=f"Concurrent filing downloads (default: {FILING_WORKERS})")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be downloaded")
     args = parser.parse_args()
 
@@ -248,13 +356,21 @@ def main():
 
     quarters = [args.quarter] if args.quarter else [1, 2, 3, 4]
 
-    for q in quarters:
-        if args.feed:
+    if args.feed:
+        for q in quarters:
             feeds = download_daily_feed(args.year, q)
             log.info("Downloaded %d feed archives for %d/QTR%d", len(feeds), args.year, q)
-            continue
+        log.info("Done.")
+        return
+
+    # Quarter indexes are independent; fetch them together (RATE_LIMIT still
+    # paces the actual requests) before working through each quarter in order
+    with ThreadPoolExecutor(max_workers=len(quarters)) as executor:
+        indexes = dict(zip(quarters, executor.map(
+            lambda q: download_index(args.year, q), quarters)))
 
-        idx = download_index(args.year, q)
+    for q in quarters:
+        idx = indexes[q]
         if not idx:
             continue
 
@@ -262,23 +378,23 @@ def main():
             continue
 
         records = parse_index(idx, filing_types=args.types)
-        log.info("Found %d filings in %d/QTR%d", len(records), args.year, q)
-
         if args.limit:
-            records = records[:args.limit]
+            # Stops parsing as soon as the limit is reached
+            records = itertools.islice(records, args.limit)
 
         if args.dry_run:
-            for r in records[:20]:
-                print(f"  {r['form_type']:10s} {r['date_filed']}  {r['company'][:40]}")
-            if len(records) > 20:
-                print(f"  ... and {len(records) - 20} more")
+            total = 0
+            for r in records:
+                if total < 20:
+                    print(f"  {r['form_type']:10s} {r['date_filed']}  {r['company'][:40]}")
+                total += 1
+            if total > 20:
+                print(f"  ... and {total - 20} more")
+            log.info("Found %d filings in %d/QTR%d", total, args.year, q)
             continue
 
-        downloaded = 0
-        for r in records:
-            if download_filing(r["filename"]):
-                downloaded += 1
-        log.info("Downloaded %d/%d filings for %d/QTR%d", downloaded, len(records), args.year, q)
+        downloaded, total = download_filings(records, args.workers)
+        log.info("Downloaded %d/%d filings for %d/QTR%d", downloaded, total, args.year, q)
 
     log.info("Done.")
 
@@ -14,6 +14,7 @@ Usage:
     python stage.py --type directive --lang en      # Download EN directives
     python stage.py --all --lang en                 # Download all types in English
     python stage.py --cellar-query                  # Run a CELLAR SPARQL query
+    python stage.py --type regulation --refresh     # Re-query cached CELLAR results
 """
 
 import argparse
@@ -23,12 +24,16 @@ import os
 import re
 import subprocess
 import sys
-import time
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import RateLimiter, get_or_fetch
 from config import storage_dir, log_dir
 
 EURLEX_SEARCH = "https://eur-lex.europa.eu/search.html"
@@ -37,6 +42,19 @@ CELLAR_SPARQL = "https://publications.europa.eu/webapi/rdf/sparql"
 STORAGE_DIR = storage_dir("eurlex")
 LOG_DIR = log_dir()
 
+# Be polite to EUR-Lex: 5 req/s in total, however many threads. Enough
+# workers are kept in flight that slow responses don't eat into that budget.
+EURLEX_RATE = 5.0
+DOWNLOAD_WORKERS = 10
+
+# CELEX IDs contain ':' which is not filename-safe everywhere
+_SAFE = str.maketrans(":", "_")
+
+# SPARQL result pages are kept in the shared stage cache, keyed by query
+# text, and refetched after a day so newly published CELEX IDs show up
+CELLAR_PAGE_SIZE = 1000
+CELLAR_TTL = 86400
+
 DOC_TYPES = {
     "regulation": "reg",
     "directive": "dir",
@@ -57,9 +75,32 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
-def cellar_query(sparql: str, limit: int = 1000) -> list[dict]:
-    """Execute a SPARQL query against the CELLAR endpoint."""
+RATE_LIMIT = RateLimiter(EURLEX_RATE)
+
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "corpus-data-stager/1.0"})
+# Sized above DOWNLOAD_WORKERS so every thread keeps its own warm connection
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20))
+
+
+def cellar_query(sparql: str, limit: int = 1000, offset: int = 0, cache: bool = True,
+                 refresh: bool = False) -> list[dict]:
+    """Execute a SPARQL query against the CELLAR endpoint.
+
+    Results are cached per query/page in the stage cache for CELLAR_TTL, so
+    re-runs and interrupted paginations don't hit the endpoint again;
+    refresh forces a new query.
+    """
     full_query = sparql if "LIMIT" in sparql.upper() else f"{sparql} LIMIT {limit}"
+    if offset:
+        full_query += f" OFFSET {offset}"
+    if not cache:
+        return _cellar_fetch(full_query)
+    return get_or_fetch(f"eurlex:cellar:{full_query}", lambda: _cellar_fetch(full_query),
+                        ttl=CELLAR_TTL, refresh=refresh)
+
+
+def _cellar_fetch(full_query: str) -> list[dict]:
     params = urllib.parse.urlencode({"query": full_query})
     url = f"{CELLAR_SPARQL}?{params}"
 
@@ -80,8 +121,13 @@ def cellar_query(sparql: str, limit: int = 1000) -> list[dict]:
     return results
 
 
-def list_celex_ids(doc_type: str, year_start: int = 2000, year_end: int = 2026) -> list[str]:
-    """Query CELLAR for CELEX identifiers of a document type."""
+def list_celex_ids(doc_type: str, year_start: int = 2000, year_end: int = 2026,
+                   max_ids: int | None = None, refresh: bool = False) -> list[str]:
+    """Query CELLAR for CELEX identifiers of a document type.
+
+    Pages through the results CELLAR_PAGE_SIZE at a time (ORDER BY keeps the
+    pages stable) and stops early once max_ids are collected.
+    """
     # CELEX sector 3 = secondary legislation
     type_code = DOC_TYPES.get(doc_type, doc_type)
 
@@ -94,13 +140,20 @@ def list_celex_ids(doc_type: str, year_start: int = 2000, year_end: int = 2026)
     ORDER BY ?celex
     """
     log.info("Querying CELLAR for %s documents", doc_type)
-    results = cellar_query(sparql, limit=10000)
-    return [r["celex"] for r in results]
+    celex_ids = []
+    offset = 0
+    while max_ids is None or len(celex_ids) < max_ids:
+        page = cellar_query(sparql, limit=CELLAR_PAGE_SIZE, offset=offset, refresh=refresh)
+        celex_ids.extend(r["celex"] for r in page)
+        if len(page) < CELLAR_PAGE_SIZE:
+            break
+        offset += CELLAR_PAGE_SIZE
+    return celex_ids[:max_ids] if max_ids else celex_ids
 
 
 def download_celex_document(celex_id: str, lang: str, dest_dir: Path) -> Path | None:
-    """Download a document by CELEX ID in HTML format."""
-    safe_id = celex_id.replace(":", "_")
+    """Download a document by CELEX ID in HTML format. dest_dir must exist."""
+    safe_id = celex_id.translate(_SAFE)
     dest = dest_dir / f"{safe_id}_{lang}.html"
     if dest.exists():
         return dest
@@ -108,12 +161,11 @@ def download_celex_document(celex_id: str, lang: str, dest_dir: Path) -> Path |
     # EUR-Lex REST endpoint for document content
     url = f"https://eur-lex.europa.eu/legal-content/{lang.upper()}/TXT/HTML/?uri=CELEX:{celex_id}"
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": "corpus-data-stager/1.0"})
-        time.sleep(0.5)  # Be polite
-        with urllib.request.urlopen(req) as resp:
-            content = resp.read()
+        RATE_LIMIT.acquire()
+        resp = SESSION.get(url, timeout=60)
+        resp.raise_for_status()
+        content = resp.content
 
-        dest.parent.mkdir(parents=True, exist_ok=True)
         dest.write_bytes(content)
         return dest
     except Exception as e:
@@ -130,6 +182,10 @@ def main():
     parser.add_argument("--cellar-query", action="store_true",
                         help="Test CELLAR SPARQL endpoint")
     parser.add_argument("--limit", type=int, default=100, help="Max documents to download")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"Concurrent document downloads (default: {DOWNLOAD_WORKERS})")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore cached CELLAR results and query the endpoint again")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be downloaded")
     args = parser.parse_args()
 
@@ -148,7 +204,7 @@ def main():
             SELECT (COUNT(?work) as ?count) WHERE {
                 ?work a cdm:legislation_secondary .
             }
-        """)
+        """, cache=False)
         print(f"Secondary legislation count: {results}")
         return
 
@@ -159,12 +215,9 @@ def main():
     for doc_type in types:
         log.info("=== %s (%s) ===", doc_type, args.lang)
 
-        celex_ids = list_celex_ids(doc_type)
+        celex_ids = list_celex_ids(doc_type, max_ids=args.limit or None, refresh=args.refresh)
         log.info("Found %d CELEX IDs for %s", len(celex_ids), doc_type)
 
-        if args.limit:
-            celex_ids = celex_ids[:args.limit]
-
         if args.dry_run:
             for cid in celex_ids[:10]:
                 print(f"  Would download: {cid}")
@@ -173,10 +226,14 @@ def main():
             continue
 
         dest_dir = STORAGE_DIR / doc_type / args.lang
+        dest_dir.mkdir(parents=True, exist_ok=True)
         downloaded = 0
-        for cid in celex_ids:
-            if download_celex_document(cid, args.lang, dest_dir):
-                downloaded += 1
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(download_celex_document, cid, args.lang, dest_dir)
+                       for cid in celex_ids]
+            for future in as_completed(futures):
+                if future.result():
+                    downloaded += 1
         log.info("Downloaded %d/%d %s documents", downloaded, len(celex_ids), doc_type)
 
     log.info("Done.")
@@ -5,7 +5,7 @@ FineWeb Dataset Downloader
 Downloads HuggingFace's FineWeb dataset (cleaned English web text from Common Crawl).
 The full dataset is 15T tokens. We use the sample-100BT subset (~500GB-1TB).
 
-Requires: huggingface_hub
+Requires: huggingface_hub (hf_transfer optional, for multi-connection downloads)
 Auth: HF_TOKEN environment variable
 
 Usage:
@@ -16,34 +16,49 @@ Usage:
 """
 
 import argparse
+import importlib.util
 import logging
 import os
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import drop_page_cache, get_or_fetch, human_size, iter_files
 from config import storage_dir, log_dir
 
 REPO_ID = "HuggingFaceFW/fineweb"
 STORAGE_DIR = storage_dir("fineweb")
 LOG_DIR = log_dir()
 
+# Parquet shards fetched concurrently by snapshot_download
+DOWNLOAD_WORKERS = min(16, os.cpu_count() or 8)
+
+# hf_transfer splits each file over several connections; huggingface_hub
+# reads this flag at import time, so it has to be set before any import
+if importlib.util.find_spec("hf_transfer"):
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+
+# FineWeb organizes subsets as directories: sample/10BT/, sample/100BT/, etc.
 SUBSETS = {
     "sample-10BT": {
         "description": "10 billion token sample (~50GB compressed)",
         "size_estimate": "~50 GB",
+        "pattern": "sample/10BT/**/*.parquet",
     },
     "sample-100BT": {
         "description": "100 billion token sample (~250GB compressed)",
         "size_estimate": "~250 GB",
+        "pattern": "sample/100BT/**/*.parquet",
     },
     "sample-350BT": {
         "description": "350 billion token sample (~900GB compressed)",
         "size_estimate": "~900 GB",
+        "pattern": "sample/350BT/**/*.parquet",
     },
     "default": {
         "description": "Full dataset, 15 trillion tokens (VERY LARGE)",
         "size_estimate": "~12 TB",
+        "pattern": "data/**/*.parquet",
     },
 }
 
@@ -65,21 +80,15 @@ def download_subset(subset: str, dest_dir: Path) -> int:
     token = os.environ.get("HF_TOKEN")
     api = HfApi(token=token)
 
-    # FineWeb organizes subsets as directories: sample/10BT/, sample/100BT/, etc.
-    if subset == "default":
-        include_pattern = "data/**/*.parquet"
-    elif subset == "sample-10BT":
-        include_pattern = "sample/10BT/**/*.parquet"
-    elif subset == "sample-100BT":
-        include_pattern = "sample/100BT/**/*.parquet"
-    elif subset == "sample-350BT":
-        include_pattern = "sample/350BT/**/*.parquet"
-    else:
+    if subset not in SUBSETS:
         log.error("Unknown subset: %s", subset)
         return 0
+    include_pattern = SUBSETS[subset]["pattern"]
 
     log.info("Downloading %s (pattern: %s)", subset, include_pattern)
     log.info("Destination: %s", dest_dir)
+    backend = "hf_transfer" if os.environ.get("HF_HUB_ENABLE_HF_TRANSFER") == "1" else "default"
+    log.info("Transfer backend: %s, %d concurrent files", backend, DOWNLOAD_WORKERS)
 
     local_dir = snapshot_download(
         repo_id=REPO_ID,
@@ -87,44 +96,40 @@ def download_subset(subset: str, dest_dir: Path) -> int:
         local_dir=str(dest_dir),
         allow_patterns=[include_pattern],
         token=token,
+        max_workers=DOWNLOAD_WORKERS,
     )
 
-    # Count downloaded files
-    count = sum(1 for _ in Path(local_dir).rglob("*.parquet"))
+    # Count downloaded files, evicting them from the page cache on the way:
+    # nothing in this process reads them back
+    count = 0
+    for path in iter_files(local_dir, (".parquet",)):
+        drop_page_cache(path)
+        count += 1
     return count
 
 
-def list_remote_files(subset: str) -> list[tuple[str, int]]:
-    """List parquet files for a subset without downloading."""
-    from huggingface_hub import HfApi
+def list_remote_files(subset: str, refresh: bool = False) -> list[tuple[str, int]]:
+    """List parquet files for a subset without downloading.
 
-    token = os.environ.get("HF_TOKEN")
-    api = HfApi(token=token)
+    Listings are cached per dataset revision, so reruns only pay for one
+    dataset_info call; pass refresh to list the repo again regardless.
+    """
+    from huggingface_hub import HfApi, HfFileSystem
 
-    if subset == "sample-10BT":
-        prefix = "sample/10BT/"
-    elif subset == "sample-100BT":
-        prefix = "sample/100BT/"
-    elif subset == "sample-350BT":
-        prefix = "sample/350BT/"
-    else:
-        prefix = "data/"
+    token = os.environ.get("HF_TOKEN")
+    sha = HfApi(token=token).dataset_info(REPO_ID).sha
 
-    files = []
-    for f in api.list_repo_tree(REPO_ID, repo_type="dataset", recursive=True,
-                                 path_in_repo=prefix):
-        size = getattr(f, "size", None)
-        if size and f.path.endswith(".parquet"):
-            files.append((f.path, size))
-    return files
+    pattern = SUBSETS[subset]["pattern"]
 
+    def fetch():
+        # One recursive glob returns every path with its size
+        root = f"datasets/{REPO_ID}/"
+        entries = HfFileSystem(token=token).glob(root + pattern, detail=True)
+        return [(path[len(root):], info["size"])
+                for path, info in entries.items() if info["type"] == "file"]
 
-def _human_size(nbytes: int) -> str:
-    for unit in ("B", "KB", "MB", "GB", "TB"):
-        if nbytes < 1024:
-            return f"{nbytes:.1f} {unit}"
-        nbytes /= 1024
-    return f"{nbytes:.1f} PB"
+    files = get_or_fetch(f"fineweb:{subset}:{sha}", fetch, ttl=None, refresh=refresh)
+    return [tuple(entry) for entry in files]
 
 
 def main():
@@ -134,6 +139,8 @@ def main():
                         help="Which subset to download")
     parser.add_argument("--count-files", action="store_true",
                         help="Count remote files for the subset (slow for large subsets)")
+    parser.add_argument("--refresh-listing", action="store_true",
+                        help="Ignore the cached remote file listing")
     parser.add_argument("--dry-run", action="store_true", help="Show info without downloading")
     args = parser.parse_args()
 
@@ -157,9 +164,9 @@ def main():
 
     if args.count_files or args.dry_run:
         log.info("Counting remote files (this may take a moment)...")
-        files = list_remote_files(args.subset)
+        files = list_remote_files(args.subset, refresh=args.refresh_listing)
         total_size = sum(s for _, s in files)
-        log.info("Found %d parquet files, total: %s", len(files), _human_size(total_size))
+        log.info("Found %d parquet files, total: %s", len(files), human_size(total_size))
         if args.dry_run:
             return
 
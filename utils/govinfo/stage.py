@@ -23,45 +23,64 @@ Usage:
 
 import argparse
 import logging
+import os
 import re
-import subprocess
+import shutil
 import sys
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import drop_page_cache, get_or_fetch
 from config import storage_dir, log_dir
 
 BULKDATA_BASE = "https://www.govinfo.gov/bulkdata/"
 STORAGE_DIR = storage_dir("govinfo")
 LOG_DIR = log_dir()
 
+# Files fetched concurrently in total, and subdivisions (years / congresses)
+# whose listings are crawled at once; all share one keep-alive pool
+DOWNLOAD_WORKERS = 8
+SUBDIVISION_WORKERS = 4
+HREF_RE = re.compile(r'href="([^"?#]+)"')
+
+# Most bulk XML files are small: bodies up to this size are read whole and
+# written with a single open/write/close instead of a chunked stream
+SMALL_FILE_MAX = 4 << 20
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+
 COLLECTIONS = {
     "FR": {
         "description": "Federal Register (daily journal of US government, 1994-present)",
         "url": BULKDATA_BASE + "FR/",
-        "pattern": r'href="(\d{4})/"',
-        "file_pattern": r'href="(FR-\d{4}-\d{2}-\d{2}\.xml)"',
+        "pattern": re.compile(r'href="(\d{4})/"'),
+        "file_pattern": re.compile(r'href="(FR-\d{4}-\d{2}-\d{2}\.xml)"'),
     },
     "CREC": {
         "description": "Congressional Record (proceedings of Congress)",
         "url": BULKDATA_BASE + "CREC/",
-        "pattern": r'href="(\d{4})/"',
+        "pattern": re.compile(r'href="(\d{4})/"'),
     },
     "CFR": {
         "description": "Code of Federal Regulations",
         "url": BULKDATA_BASE + "CFR/",
-        "pattern": r'href="(\d{4})/"',
+        "pattern": re.compile(r'href="(\d{4})/"'),
     },
     "BILLS": {
         "description": "Congressional bills",
         "url": BULKDATA_BASE + "BILLS/",
-        "pattern": r'href="(\d+)/"',  # Congress number
+        "pattern": re.compile(r'href="(\d+)/"'),  # Congress number
     },
     "PLAW": {
         "description": "Public laws",
         "url": BULKDATA_BASE + "PLAW/",
-        "pattern": r'href="(\d+)/"',
+        "pattern": re.compile(r'href="(\d+)/"'),
     },
 }
 
@@ -75,6 +94,18 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "corpus-data-stager/1.0"})
+_adapter = HTTPAdapter(pool_connections=2,
+                       pool_maxsize=DOWNLOAD_WORKERS + SUBDIVISION_WORKERS,
+                       max_retries=Retry(total=3, backoff_factor=0.5,
+                                         status_forcelist=(429, 500, 502, 503, 504)))
+SESSION.mount("https://", _adapter)
+
+# One pool for every crawl, so concurrent subdivisions don't multiply the
+# number of downloads in flight against govinfo.gov
+DOWNLOAD_POOL = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+
 
 def _fetch(url: str) -> str:
     """Fetch a URL with proper User-Agent."""
@@ -105,44 +136,97 @@ def list_subdivisions(collection: str) -> list[str]:
         return [str(c) for c in range(103, 119 + 1)]
     else:
         info = COLLECTIONS[collection]
-        html = _fetch(info["url"])
-        return sorted(set(re.findall(info["pattern"], html)))
+        return get_or_fetch(
+            f"govinfo:{collection}",
+            lambda: sorted(set(info["pattern"].findall(_fetch(info["url"])))),
+        )
+
+
+_made_dirs: set[Path] = set()
+
+
+def _ensure_dir(directory: Path):
+    """mkdir -p, skipped for directories already created this run."""
+    if directory not in _made_dirs:
+        directory.mkdir(parents=True, exist_ok=True)
+        _made_dirs.add(directory)
+
+
+def _write_small(path: Path, data: bytes):
+    fd = os.open(path, _WRITE_FLAGS, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _download_file(url: str, dest: Path) -> bool:
+    """Download one file to disk via a .part file. Returns False on failure."""
+    part = dest.with_name(dest.name + ".part")
+    try:
+        _ensure_dir(dest.parent)
+        with SESSION.get(url, stream=True, timeout=120) as resp:
+            resp.raise_for_status()
+            length = int(resp.headers.get("Content-Length") or -1)
+            if 0 <= length <= SMALL_FILE_MAX:
+                _write_small(part, resp.content)
+            else:
+                resp.raw.decode_content = True
+                with open(part, "wb") as f:
+                    shutil.copyfileobj(resp.raw, f, 1 << 20)
+        os.replace(part, dest)
+        drop_page_cache(dest)
+        return True
+    except Exception as e:
+        log.warning("Failed %s: %s", url, e)
+        part.unlink(missing_ok=True)
+        return False
 
 
 def download_recursive(url: str, dest_dir: Path, dry_run: bool = False) -> int:
-    """Recursively download all XML/ZIP files under a URL using wget."""
+    """Recursively download all XML/ZIP files under a URL.
+
+    Directory listings are walked in this thread while the files they link
+    to download on the shared DOWNLOAD_POOL. Local paths follow the old wget layout
+    (-nH --cut-dirs=2), and files already on disk are skipped.
+    """
     dest_dir.mkdir(parents=True, exist_ok=True)
 
     if dry_run:
-        log.info("DRY RUN: would wget -r %s", url)
+        log.info("DRY RUN: would crawl %s", url)
         return 0
 
     log.info("Downloading recursively: %s -> %s", url, dest_dir)
-    result = subprocess.run(
-        ["wget", "-r", "-np", "-nH", "--cut-dirs=2",
-         "-A", "*.xml,*.zip",
-         "-P", str(dest_dir),
-         "--wait=0.2", "--random-wait",
-         "-e", "robots=off",
-         url],
-        capture_output=True,
-        text=True,
-    )
-    if result.returncode not in (0, 8):  # 8 = some files not retrieved (normal)
-        log.warning("wget returned %d for %s", result.returncode, url)
-
-    # Count downloaded files
-    count = sum(1 for _ in dest_dir.rglob("*.xml"))
-    count += sum(1 for _ in dest_dir.rglob("*.zip"))
-    return count
-
-
-def _human_size(nbytes: int) -> str:
-    for unit in ("B", "KB", "MB", "GB", "TB"):
-        if nbytes < 1024:
-            return f"{nbytes:.1f} {unit}"
-        nbytes /= 1024
-    return f"{nbytes:.1f} PB"
+    pending, seen = [url], {url}
+    existing, futures = 0, []
+
+    while pending:
+        page = pending.pop()
+        try:
+            resp = SESSION.get(page, timeout=60)
+            resp.raise_for_status()
+        except Exception as e:
+            log.warning("Failed listing %s: %s", page, e)
+            continue
+
+        for href in HREF_RE.findall(resp.text):
+            link = urljoin(page, href)
+            if not link.startswith(url) or link in seen:
+                continue  # no-parent, and each page/file once
+            seen.add(link)
+            if link.endswith((".xml", ".zip")):
+                # Drop "bulkdata/<COLLECTION>/", as --cut-dirs=2 did
+                dest = dest_dir / urlparse(link).path.lstrip("/").split("/", 2)[2]
+                if dest.exists():
+                    existing += 1
+                else:
+                    futures.append(DOWNLOAD_POOL.submit(_download_file, link, dest))
+            elif link.endswith("/") or "." not in link.rsplit("/", 1)[1]:
+                pending.append(link)
+
+    return existing + sum(f.result() for f in futures)
 
 
 def main():
@@ -186,13 +270,16 @@ def main():
         log.info("Processing %d subdivisions for %s", len(subdivisions), collection)
         dest_dir = STORAGE_DIR / collection
 
-        total_files = 0
-        for sub in subdivisions:
-            url = info["url"] + sub + "/"
-            sub_dir = dest_dir / sub
-            count = download_recursive(url, sub_dir, dry_run=args.dry_run)
-            total_files += count
+        def crawl(sub: str) -> int:
+            count = download_recursive(info["url"] + sub + "/", dest_dir / sub,
+                                       dry_run=args.dry_run)
             log.info("%s/%s: %d files", collection, sub, count)
+            return count
+
+        # Threads rather than processes: the work is network-bound and they
+        # share the session's connection pool
+        with ThreadPoolExecutor(max_workers=SUBDIVISION_WORKERS) as executor:
+            total_files = sum(executor.map(crawl, subdivisions))
 
         log.info("Done with %s: %d total files", collection, total_files)
 
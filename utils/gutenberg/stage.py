@@ -1,20 +1,76 @@
 #!/usr/bin/env python3
 import sys
-import json
+import importlib.util
+import os
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import dumps
 from config import storage_dir
 
-from datasets import load_dataset
+# Multi-connection shard downloads when hf_transfer is installed; must be set
+# before huggingface_hub is imported
+if importlib.util.find_spec("hf_transfer"):
+    os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+
+import pyarrow.dataset as pads
+from huggingface_hub import snapshot_download
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+REPO_ID = "sedthh/gutenberg_english"
+COLUMNS = ["TEXT", "SOURCE", "METADATA"]
+
+# Rows are whole books (~400 KB of text on average), so decode batches are
+# small and the write buffer is sized in bytes
+BATCH_ROWS = 64
+WRITE_CHUNK = 4 << 20
+DOWNLOAD_WORKERS = 8
+
+# English prose compresses ~3x at zstd level 3; the multi-threaded encoder
+# keeps up with the JSON encoding loop
+ZSTD_LEVEL = 3
 
 dest = storage_dir("gutenberg")
-ds = load_dataset("sedthh/gutenberg_english", split="train", streaming=True)
+
+# Fetch all parquet shards in parallel up front (skips ones already local),
+# then let Arrow decode them on its own thread pool while this thread
+# encodes and writes
+parquet_dir = snapshot_download(
+    repo_id=REPO_ID,
+    repo_type="dataset",
+    allow_patterns="*.parquet",
+    local_dir=dest / "parquet",
+    max_workers=DOWNLOAD_WORKERS,
+)
+scanner = pads.dataset(parquet_dir, format="parquet").scanner(
+    columns=COLUMNS, batch_size=BATCH_ROWS, use_threads=True,
+)
+
+# Compressed output when zstandard is installed, plain JSONL otherwise
+if zstandard is not None:
+    out_path = dest / "gutenberg_all.jsonl.zst"
+    raw = open(out_path, "wb", buffering=1 << 20)
+    out = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1).stream_writer(raw)
+else:
+    out_path = dest / "gutenberg_all.jsonl"
+    out = open(out_path, "wb", buffering=1 << 20)
+
 count = 0
-with open(dest / "gutenberg_all.jsonl", "w") as f:
-    for row in ds:
-        json.dump({"id": count, "text": row["TEXT"], "source": row.get("SOURCE",""), "metadata": row.get("METADATA","")}, f)
-        f.write("\n")
-        count += 1
-        if count % 1000 == 0:
-            print(f"  {count} books downloaded...")
-print(f"Done: {count} books total")
+buf = bytearray()
+with out as f:
+    for batch in scanner.to_batches():
+        cols = batch.to_pydict()
+        for text, source, metadata in zip(cols["TEXT"], cols["SOURCE"], cols["METADATA"]):
+            buf += dumps({"id": count, "text": text, "source": source, "metadata": metadata})
+            buf += b"\n"
+            count += 1
+            if count % 1000 == 0:
+                print(f"  {count} books downloaded...")
+        if len(buf) >= WRITE_CHUNK:
+            f.write(buf)
+            buf.clear()
+    f.write(buf)
+print(f"Done: {count} books total -> {out_path}")
@@ -1,16 +1,33 @@
 #!/usr/bin/env python3
 """NY Courts Search API Crawler - Uses the official search form"""
+import argparse
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 from pathlib import Path
+import io
+import re
+from html import unescape as html_unescape
+import sqlite3
+import tarfile
+import threading
 import time
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import RateLimiter, conditional_headers, drop_page_cache, page_text, save_validators
 from config import storage_dir
 
 SEARCH_URL = "https://iapps.courts.state.ny.us/lawReporting/Search"
 
+# Opinions fetched concurrently, and total requests per second across them
+DOWNLOAD_WORKERS = 8
+REQUEST_RATE = 5.0
+
+# --output-format tar: index rows committed per batch of appended opinions
+TAR_INDEX_COMMIT_EVERY = 100
+
 COURTS = {
     "Court of Appeals": "court_of_appeals",
     "App Div, 1st Dept": "appellate_division_1st",
@@ -19,6 +36,79 @@ COURTS = {
     "App Div, 4th Dept": "appellate_division_4th",
 }
 
+# Polite global cap shared by every download thread
+RATE_LIMIT = RateLimiter(REQUEST_RATE)
+
+# Only hrefs are needed from the search results, so skip building a DOM
+OPINION_LINK_RE = re.compile(rb'''href=["']([^"']*lawReporting/Opinion[^"']*)["']''')
+
+# Keep-alive pool shared by the search POSTs and opinion GETs
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                       max_retries=Retry(total=3, backoff_factor=0.5,
+                                         status_forcelist=(500, 502, 503, 504)))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+class TarWriter:
+    """Appends opinions to one tar per court/year, with a sqlite index.
+
+    The index (<tar>.idx.sqlite) maps each URL to its member name, data
+    offset and size, so reruns skip known URLs without scanning the tar and
+    readers can seek straight to a member. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.index = sqlite3.connect(self.path.with_suffix(".idx.sqlite"),
+                                     check_same_thread=False)
+        self.index.execute("CREATE TABLE IF NOT EXISTS members "
+                           "(url TEXT PRIMARY KEY, name TEXT, offset INTEGER, size INTEGER)")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # Cut anything past the last indexed member (e.g. a write interrupted
+        # before its index row was committed) and re-terminate the archive
+        # there, then append after it
+        end = self.index.execute(
+            "SELECT MAX(offset + (size + 511) / 512 * 512) FROM members").fetchone()[0]
+        if end and self.path.exists():
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+                f.seek(end)
+                f.write(b"\0" * (2 * tarfile.BLOCKSIZE))
+            self.tar = tarfile.open(self.path, "a")
+        else:
+            self.tar = tarfile.open(self.path, "w")
+
+    def __contains__(self, url):
+        with self._lock:
+            return self.index.execute(
+                "SELECT 1 FROM members WHERE url = ?", (url,)).fetchone() is not None
+
+    def add(self, url, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        with self._lock:
+            self.tar.addfile(info, io.BytesIO(data))
+            # The data block ends the archive so far (padded to whole blocks)
+            offset = self.tar.offset - (info.size + 511) // 512 * 512
+            self.index.execute("INSERT OR REPLACE INTO members VALUES (?, ?, ?, ?)",
+                               (url, name, offset, info.size))
+            self._pending += 1
+            if self._pending >= TAR_INDEX_COMMIT_EVERY:
+                self.tar.fileobj.flush()
+                self.index.commit()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self.tar.close()
+            self.index.commit()
+            self.index.close()
+
 def search_by_date_range(court, start_date, end_date):
     """Search for opinions by court and date range"""
     data = {
@@ -39,27 +129,38 @@ def search_by_date_range(court, start_date, end_date):
         'Submit': 'Find'
     }
     
-    r = requests.post(SEARCH_URL, data=data, timeout=30)
-    return r.text
+    RATE_LIMIT.acquire()
+    r = SESSION.post(SEARCH_URL, data=data, timeout=30)
+    return r.content
 
 def extract_opinion_links(html):
-    """Extract opinion URLs from search results"""
-    soup = BeautifulSoup(html, 'html.parser')
-    links = []
-    for a in soup.find_all('a', href=True):
-        if 'lawReporting/Opinion' in a['href']:
-            links.append(a['href'])
-    return links
-
-def download_opinion(url, output_path):
-    """Download opinion text"""
-    r = requests.get(url, timeout=30)
-    soup = BeautifulSoup(r.text, 'html.parser')
+    """Extract opinion URLs from search results (raw response bytes)"""
+    return [html_unescape(m.decode('utf-8', 'replace')) for m in OPINION_LINK_RE.findall(html)]
+
+def download_opinion(url, output_path, tar=None):
+    """Download opinion text (revalidated if already on disk).
+
+    With tar, the text is appended to that archive as output_path's name
+    instead of being written as its own file.
+    """
+    RATE_LIMIT.acquire()
+    r = SESSION.get(url, headers=conditional_headers(output_path), timeout=30)
+    if r.status_code == 304:
+        return
+    # An error page must not be stored, nor its validators saved
+    r.raise_for_status()
+    text = page_text(r.content)
+    if tar is not None:
+        tar.add(url, output_path.name, f"URL: {url}\n{'='*80}\n\n{text}".encode('utf-8'))
+        return
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_path, 'w') as f:
-        f.write(f"URL: {url}\n{'='*80}\n\n{soup.get_text()}")
+        f.write(f"URL: {url}\n{'='*80}\n\n{text}")
+    drop_page_cache(output_path)
+    save_validators(output_path, r.headers)
 
-def crawl_court_year(court_name, court_code, year, output_dir):
+def crawl_court_year(court_name, court_code, year, output_dir, revalidate=False,
+                     workers=DOWNLOAD_WORKERS, output_format="files"):
     """Crawl all opinions for a court in a given year"""
     print(f"\n{court_name} - {year}")
     
@@ -71,29 +172,65 @@ def crawl_court_year(court_name, court_code, year, output_dir):
     
     print(f"  Found {len(links)} opinions")
     
-    for i, link in enumerate(links):
+    tar = None
+    if output_format == "tar":
+        tar = TarWriter(Path(output_dir) / court_code / f"opinions-{court_code}-{year}.tar")
+    
+    jobs = []
+    for link in links:
         full_url = f"https://iapps.courts.state.ny.us{link}" if link.startswith('/') else link
         filename = link.split('/')[-1] + '.txt'
         output_path = Path(output_dir) / court_code / str(year) / filename
         
-        if output_path.exists():
+        if tar is not None:
+            done = full_url in tar
+        else:
+            done = output_path.exists() and not revalidate
+        if done:
             continue
-        
-        print(f"  [{i+1}/{len(links)}]", end='\r')
-        download_opinion(full_url, output_path)
-        time.sleep(0.5)
+        jobs.append((full_url, output_path))
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(download_opinion, url, path, tar): url for url, path in jobs}
+            for i, future in enumerate(as_completed(futures)):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"  ERROR {futures[future]}: {e}")
+                print(f"  [{i+1}/{len(jobs)}]", end='\r')
+    finally:
+        if tar is not None:
+            tar.close()
     
     print(f"  Downloaded: {len(links)}")
     return len(links)
 
 def main():
+    global RATE_LIMIT
+    parser = argparse.ArgumentParser(description="NY Courts search crawler")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="Re-check existing opinions with conditional GETs "
+                             "instead of skipping them")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"Concurrent downloads (default: {DOWNLOAD_WORKERS})")
+    parser.add_argument("--rate", type=float, default=REQUEST_RATE,
+                        help=f"Max requests per second across all workers (default: {REQUEST_RATE})")
+    parser.add_argument("--output-format", choices=["files", "tar"], default="files",
+                        help="One .txt file per opinion, or one tar per court/year "
+                             "with a sqlite URL index")
+    args = parser.parse_args()
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    RATE_LIMIT = RateLimiter(args.rate)
     output_dir = str(storage_dir("nycourts"))
     
     # Crawl 2003-2026
     total = 0
     for year in range(2003, 2027):
         for court_name, court_code in COURTS.items():
-            count = crawl_court_year(court_name, court_code, year, output_dir)
+            count = crawl_court_year(court_name, court_code, year, output_dir,
+                                     args.revalidate, args.workers, args.output_format)
             total += count
     
     print(f"\nTOTAL: {total} opinions")
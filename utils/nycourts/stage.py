@@ -3,18 +3,27 @@
 NY Courts Full Archive Crawler
 Coverage: 1847-present (all available formats: HTML, PDF)
 """
+import argparse
 import requests
-from bs4 import BeautifulSoup
-import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import re
 import os
+from html import unescape as html_unescape
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import RateLimiter, conditional_headers, drop_page_cache, page_text, save_validators
 from config import storage_dir
 
 BASE_URL = "http://nycourts.gov/reporter"
 
+# Documents fetched concurrently, and total requests per second across them
+DOWNLOAD_WORKERS = 8
+REQUEST_RATE = 5.0
+
 COURTS = {
     "court_of_appeals": "cidxtable.shtml",
     "appellate_division_1st": "aidxtable_1.shtml",
@@ -25,65 +34,94 @@ COURTS = {
     "appellate_term_2nd": "at_2_idxtable.shtml",
 }
 
-def fetch(url, retries=3):
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+# Polite global cap shared by every download thread
+RATE_LIMIT = RateLimiter(REQUEST_RATE)
+
+# Opinion/archive anchors, matched over the raw page bytes in one pass; the
+# label is kept raw and only cleaned up for links that are actually used
+LINK_RE = re.compile(
+    rb'''<a\s[^>]*?href=["']([^"']*(?:3dseries/|slipop/|archives/|\.pdf|\.htm)[^"']*)["'][^>]*>(.*?)</a>''',
+    re.IGNORECASE | re.DOTALL,
+)
+TAG_RE = re.compile(rb'<[^>]+>')
+
+# One keep-alive pool for every request; transient failures are retried by
+# the adapter with exponential backoff
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'})
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                       max_retries=Retry(total=3, backoff_factor=0.5,
+                                         status_forcelist=(500, 502, 503, 504)))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+def fetch(url, headers=None):
     # Force HTTP, disable redirects to HTTPS
     url = url.replace('https://', 'http://')
-    for i in range(retries):
-        try:
-            r = requests.get(url, headers=headers, timeout=30, allow_redirects=False)
-            if r.status_code == 301 or r.status_code == 302:
-                # Manual redirect handling, keep HTTP
-                new_url = r.headers.get('Location', '').replace('https://', 'http://')
-                r = requests.get(new_url, headers=headers, timeout=30)
-            r.raise_for_status()
-            return r
-        except Exception as e:
-            if i == retries - 1:
-                print(f"  ERROR: {e}")
-                return None
-            time.sleep(2)
+    try:
+        RATE_LIMIT.acquire()
+        r = SESSION.get(url, headers=headers, timeout=30, allow_redirects=False)
+        if r.status_code == 301 or r.status_code == 302:
+            # Manual redirect handling, keep HTTP
+            new_url = r.headers.get('Location', '').replace('https://', 'http://')
+            RATE_LIMIT.acquire()
+            r = SESSION.get(new_url, headers=headers, timeout=30)
+        r.raise_for_status()
+        return r
+    except Exception as e:
+        print(f"  ERROR: {e}")
+        return None
 
 def save_file(content, path, is_binary=False):
     path.parent.mkdir(parents=True, exist_ok=True)
     mode = 'wb' if is_binary else 'w'
     with open(path, mode) as f:
         f.write(content)
+    drop_page_cache(path)
 
 def extract_links(html):
-    """Extract all opinion/archive links"""
-    soup = BeautifulSoup(html, 'html.parser')
-    links = []
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        text = a.get_text(strip=True)
-        # Match opinion links and archive links
-        if any(x in href for x in ['3dseries/', 'slipop/', 'archives/', '.pdf', '.htm']):
-            links.append({"href": href, "text": text})
-    return links
+    """Extract all opinion/archive links (from raw response bytes)"""
+    return [{"href": html_unescape(href.decode('utf-8', 'replace')), "label": label}
+            for href, label in LINK_RE.findall(html)]
+
+def link_text(link):
+    """Visible text of an extracted link, for log lines."""
+    text = TAG_RE.sub(b'', link['label']).decode('utf-8', 'replace')
+    return ' '.join(html_unescape(text).split())
 
 def download_document(url, output_path):
-    """Download HTML or PDF document"""
-    r = fetch(url)
-    if not r:
+    """Download HTML or PDF document (revalidated if already on disk)"""
+    r = fetch(url, headers=conditional_headers(output_path))
+    if r is None or r.status_code == 304:
         return False
     
     if url.endswith('.pdf'):
         save_file(r.content, output_path, is_binary=True)
     else:
-        soup = BeautifulSoup(r.text, 'html.parser')
-        text = soup.get_text()
+        text = page_text(r.content)
         save_file(f"URL: {url}\n{'='*80}\n\n{text}", output_path)
+    save_validators(output_path, r.headers)
     return True
 
-def crawl_index_page(index_url, court_name, year, month, output_dir):
+def download_all(jobs, workers=DOWNLOAD_WORKERS):
+    """Download (url, output_path) pairs concurrently. Returns the success count."""
+    count = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download_document, url, path) for url, path in jobs]
+        for future in as_completed(futures):
+            if future.result():
+                count += 1
+    return count
+
+def crawl_index_page(index_url, court_name, year, month, output_dir, revalidate=False,
+                     workers=DOWNLOAD_WORKERS):
     """Crawl a single index page (month/year)"""
     html = fetch(index_url)
     if not html:
         return 0
     
-    links = extract_links(html.text)
-    count = 0
+    links = extract_links(html.content)
+    jobs = []
     
     for link in links:
         href = link['href']
@@ -105,17 +143,16 @@ def crawl_index_page(index_url, court_name, year, month, output_dir):
         # Organize: /court/year/month/filename
         output_path = Path(output_dir) / court_name / str(year) / f"{month:02d}" / filename
         
-        if output_path.exists():
+        if output_path.exists() and not revalidate:
             continue
             
-        print(f"    {link['text'][:60]}")
-        if download_document(url, output_path):
-            count += 1
-        time.sleep(0.3)
+        print(f"    {link_text(link)[:60]}")
+        jobs.append((url, output_path))
     
-    return count
+    return download_all(jobs, workers)
 
-def crawl_court_archives(court_name, court_file, output_dir):
+def crawl_court_archives(court_name, court_file, output_dir, revalidate=False,
+                         workers=DOWNLOAD_WORKERS):
     """Crawl full archive for a court (2003-present)"""
     print(f"\n{'='*80}")
     print(f"Crawling: {court_name}")
@@ -134,7 +171,7 @@ def crawl_court_archives(court_name, court_file, output_dir):
         index_url = f"{BASE_URL}/slipidx/{court_file}"
         
         print(f"\n{court_name} - {year}/{month:02d}")
-        count = crawl_index_page(index_url, court_name, year, month, output_dir)
+        count = crawl_index_page(index_url, court_name, year, month, output_dir, revalidate, workers)
         total += count
         print(f"  Downloaded: {count}")
         
@@ -149,7 +186,7 @@ def crawl_court_archives(court_name, court_file, output_dir):
     
     return total
 
-def crawl_notable_cases(output_dir):
+def crawl_notable_cases(output_dir, revalidate=False, workers=DOWNLOAD_WORKERS):
     """Crawl notable/landmark cases (pre-2003)"""
     print(f"\n{'='*80}")
     print("Crawling: Notable Cases (Historical)")
@@ -160,8 +197,8 @@ def crawl_notable_cases(output_dir):
     if not html:
         return 0
     
-    links = extract_links(html.text)
-    count = 0
+    links = extract_links(html.content)
+    jobs = []
     
     for link in links:
         href = link['href']
@@ -174,27 +211,39 @@ def crawl_notable_cases(output_dir):
         
         output_path = Path(output_dir) / "notable_cases" / filename
         
-        if output_path.exists():
+        if output_path.exists() and not revalidate:
             continue
         
-        print(f"  {link['text'][:70]}")
-        if download_document(full_url, output_path):
-            count += 1
-        time.sleep(0.3)
+        print(f"  {link_text(link)[:70]}")
+        jobs.append((full_url, output_path))
     
-    return count
+    return download_all(jobs, workers)
 
 def main():
+    global RATE_LIMIT
+    parser = argparse.ArgumentParser(description="NY Courts archive crawler")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="Re-check existing documents with conditional GETs "
+                             "instead of skipping them")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"Concurrent downloads (default: {DOWNLOAD_WORKERS})")
+    parser.add_argument("--rate", type=float, default=REQUEST_RATE,
+                        help=f"Max requests per second across all workers (default: {REQUEST_RATE})")
+    args = parser.parse_args()
+    if args.rate <= 0:
+        parser.error("--rate must be positive")
+    RATE_LIMIT = RateLimiter(args.rate)
     output_dir = str(storage_dir("nycourts"))
     
     # Crawl notable/historical cases first
-    notable_count = crawl_notable_cases(output_dir)
+    notable_count = crawl_notable_cases(output_dir, args.revalidate, args.workers)
     print(f"\nNotable cases downloaded: {notable_count}")
     
     # Crawl each court's archives
     total = 0
     for court_name, court_file in COURTS.items():
-        count = crawl_court_archives(court_name, court_file, output_dir)
+        count = crawl_court_archives(court_name, court_file, output_dir,
+                                     args.revalidate, args.workers)
         total += count
     
     print(f"\n{'='*80}")
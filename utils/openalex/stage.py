@@ -7,6 +7,9 @@ Downloads the OpenAlex academic graph snapshot from S3.
 
 Public S3 bucket: s3://openalex (--no-sign-request)
 
+Uses boto3 (anonymous, pooled, concurrent transfers) when installed and
+falls back to the aws CLI otherwise.
+
 This is primarily for NAS staging. The s3-connector can also crawl
 this bucket directly for the pipeline.
 
@@ -20,14 +23,26 @@ Usage:
 
 import argparse
 import logging
+import os
 import subprocess
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from config import storage_dir, log_dir
 
-S3_BUCKET = "s3://openalex"
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore import UNSIGNED
+    from botocore.config import Config
+except ImportError:
+    boto3 = None
+
+BUCKET = "openalex"
+S3_BUCKET = f"s3://{BUCKET}"
 STORAGE_DIR = storage_dir("openalex")
 LOG_DIR = log_dir()
 
@@ -37,6 +52,11 @@ ENTITIES = [
     "fields", "subfields", "domains",
 ]
 
+# Objects downloaded at once, and parallel parts within each large object
+DOWNLOAD_WORKERS = 32
+PART_CONCURRENCY = 16
+PART_SIZE = 16 * 1024 * 1024
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -48,8 +68,43 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
+_s3 = None
+# boto3.client() on the default session isn't thread-safe, and the first
+# call can come from several listing threads at once
+_s3_lock = threading.Lock()
+
+
+def _s3_client():
+    """Anonymous S3 client with a connection pool sized for the download threads."""
+    global _s3
+    if _s3 is None:
+        with _s3_lock:
+            if _s3 is None:
+                _s3 = boto3.client("s3", config=Config(
+                    signature_version=UNSIGNED,
+                    max_pool_connections=DOWNLOAD_WORKERS * 2,
+                ))
+    return _s3
+
+
+def _iter_objects(prefix: str):
+    """Yield every object under a prefix via paginated ListObjectsV2."""
+    paginator = _s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=BUCKET, Prefix=prefix):
+        yield from page.get("Contents", [])
+
+
+def _entity_size(entity: str) -> str:
+    total = sum(obj["Size"] for obj in _iter_objects(f"data/{entity}/"))
+    return f"Total Size: {total / 1024**3:.1f} GiB"
+
+
 def list_entity_sizes() -> dict[str, str]:
     """List each entity directory and its approximate size on S3."""
+    if boto3 is not None:
+        with ThreadPoolExecutor(max_workers=len(ENTITIES)) as executor:
+            return dict(zip(ENTITIES, executor.map(_entity_size, ENTITIES)))
+
     sizes = {}
     for entity in ENTITIES:
         result = subprocess.run(
@@ -65,6 +120,52 @@ def list_entity_sizes() -> dict[str, str]:
     return sizes
 
 
+def _is_current(path: Path, obj: dict) -> bool:
+    """Same rule as `aws s3 sync`: skip when size matches and the local copy isn't older."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return False
+    return st.st_size == obj["Size"] and st.st_mtime >= obj["LastModified"].timestamp()
+
+
+def _download_object(obj: dict, path: Path, transfer: "TransferConfig") -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _s3_client().download_file(BUCKET, obj["Key"], str(path), Config=transfer)
+    # Stamp the S3 modification time so the next sync sees it as current
+    mtime = obj["LastModified"].timestamp()
+    os.utime(path, (mtime, mtime))
+
+
+def _sync_entity_boto3(entity: str, dest: Path) -> bool:
+    prefix = f"data/{entity}/"
+    transfer = TransferConfig(max_concurrency=PART_CONCURRENCY,
+                              multipart_chunksize=PART_SIZE, use_threads=True)
+    failed = skipped = 0
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        futures = {}
+        for obj in _iter_objects(prefix):
+            if obj["Key"].endswith("/"):
+                continue
+            path = dest / obj["Key"][len(prefix):]
+            if _is_current(path, obj):
+                skipped += 1
+                continue
+            futures[executor.submit(_download_object, obj, path, transfer)] = obj["Key"]
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                log.error("Failed %s: %s", futures[future], e)
+
+    log.info("%s: %d downloaded, %d up to date, %d failed",
+             entity, len(futures) - failed, skipped, failed)
+    return failed == 0
+
+
 def sync_entity(entity: str, dest_dir: Path) -> bool:
     """Sync an entity directory from S3 to local storage."""
     src = f"{S3_BUCKET}/data/{entity}/"
@@ -72,6 +173,9 @@ def sync_entity(entity: str, dest_dir: Path) -> bool:
     dest.mkdir(parents=True, exist_ok=True)
 
     log.info("Syncing %s -> %s", src, dest)
+    if boto3 is not None:
+        return _sync_entity_boto3(entity, dest)
+
     result = subprocess.run(
         ["aws", "s3", "sync", src, str(dest), "--no-sign-request"],
         check=False,
@@ -13,26 +13,64 @@ Usage:
     python stage.py --list                 # List available files
     python stage.py --updates              # Download daily update files
     python stage.py --verify               # Verify MD5 checksums
+    python stage.py --verify --quick       # Re-check verified files via local BLAKE3 sidecars
     python stage.py --range 1 10           # Download files 1-10 only
+    python stage.py --jobs 4               # Concurrent downloads (default 8)
+    python stage.py --aria2c               # Bulk download with aria2c, then verify/fill gaps
 """
 
 import argparse
+import functools
 import hashlib
 import logging
+import os
 import re
+import shutil
 import subprocess
 import sys
-import urllib.request
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import (drop_page_cache, existing_names, get_or_fetch, human_size,
+                    open_listing, ranged_download, stream_hrefs)
 from config import storage_dir, log_dir
 
+# Fast local hash for --quick re-verification. PubMed only publishes MD5,
+# so the first check is always against upstream; after that a sidecar with
+# this digest lets later sweeps run at SIMD hashing speed
+try:
+    from blake3 import blake3 as _quick_hash
+    QUICK_SUFFIX = ".blake3"
+except ImportError:
+    _quick_hash = functools.partial(hashlib.blake2b, digest_size=32)
+    QUICK_SUFFIX = ".blake2b"
+
 BASE_URL = "https://ftp.ncbi.nlm.nih.gov/pubmed/baseline/"
 UPDATE_URL = "https://ftp.ncbi.nlm.nih.gov/pubmed/updatefiles/"
 STORAGE_DIR = storage_dir("pubmed_abstracts")
 LOG_DIR = log_dir()
 
+# Files downloaded (and verified) concurrently, and HTTP Range requests
+# each ~20 MB file is split across
+DOWNLOAD_JOBS = 8
+RANGE_PARTS = 2
+
+_PUBMED_FILE_RE = re.compile(r'pubmed\d+n\d+\.xml\.gz')
+_FILE_NUM_RE = re.compile(r'n(\d+)\.xml\.gz')
+_MD5_RE = re.compile(r'=\s*([a-f0-9]{32})')
+
+# --verify: the published .md5 sidecars are all fetched up front, this many
+# at a time, and cached for a day
+MD5_JOBS = 16
+
+# --aria2c: connections per file (files in flight follow --jobs)
+ARIA2_SPLIT = 8
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -43,94 +81,239 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+# One keep-alive pool shared by every download thread (no per-file
+# process spawn, DNS lookup or TLS handshake)
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "corpus-data-stager/1.0",
+                        # Files are already gzipped; keep the bytes the MD5s describe
+                        "Accept-Encoding": "identity"})
+SESSION.mount("https://", HTTPAdapter(pool_connections=4,
+                                      pool_maxsize=DOWNLOAD_JOBS * RANGE_PARTS))
+
 
 def list_files(url: str) -> list[str]:
     """Scrape NCBI FTP listing for .xml.gz files."""
     log.info("Fetching file list from %s", url)
-    req = urllib.request.Request(url, headers={"User-Agent": "corpus-data-stager/1.0"})
-    with urllib.request.urlopen(req) as resp:
-        html = resp.read().decode("utf-8")
-    files = sorted(set(re.findall(r'(pubmed\d+n\d+\.xml\.gz)(?!\.md5)', html)))
-    return files
+    with open_listing(url, {"User-Agent": "corpus-data-stager/1.0"}) as resp:
+        files = stream_hrefs(resp, _PUBMED_FILE_RE.fullmatch)
+    return sorted(set(files))
+
 
+def download_file(filename: str, url_base: str, dest_dir: Path, hasher=None,
+                  existing: set[str] | None = None) -> Path:
+    """Download a single file, skip if exists.
 
-def download_file(filename: str, url_base: str, dest_dir: Path) -> Path:
-    """Download a single file using curl, skip if exists."""
+    A hasher (hashlib object) is fed the body as it downloads (from the page
+    cache once the ranges land, for split downloads); it is left untouched
+    when the file already exists. existing, if given, is the set of names
+    already in dest_dir and replaces the per-file stat.
+    """
     dest = dest_dir / filename
-    if dest.exists():
+    if filename in existing if existing is not None else dest.exists():
         log.info("Already exists, skipping: %s", filename)
         return dest
 
     url = url_base + filename
     log.info("Downloading %s", filename)
-    result = subprocess.run(
-        ["curl", "-L", "-o", str(dest), "--progress-bar", url],
-        check=False,
-    )
-    if result.returncode != 0:
-        log.error("Failed to download %s", filename)
-        dest.unlink(missing_ok=True)
+    try:
+        ranged_download(SESSION, url, dest, RANGE_PARTS, hasher=hasher)
+    except (requests.RequestException, OSError) as e:
+        log.error("Failed to download %s: %s", filename, e)
         return None
 
-    log.info("Downloaded %s (%s)", filename, _human_size(dest.stat().st_size))
+    drop_page_cache(dest)
+    dest.with_name(filename + ".aria2").unlink(missing_ok=True)  # stale --aria2c control file
+    log.info("Downloaded %s (%s)", filename, human_size(dest.stat().st_size))
     return dest
 
 
-def download_md5(filename: str, url_base: str, dest_dir: Path) -> str | None:
+def download_md5(filename: str, url_base: str) -> str | None:
     """Download and parse the MD5 checksum file."""
-    md5_file = filename + ".md5"
-    url = url_base + md5_file
-    try:
-        req = urllib.request.Request(url, headers={"User-Agent": "corpus-data-stager/1.0"})
-        with urllib.request.urlopen(req) as resp:
-            content = resp.read().decode("utf-8").strip()
+    url = url_base + filename + ".md5"
+
+    def fetch():
+        # Over the shared session: a pooled keep-alive connection, not a new
+        # TLS handshake per checksum
+        resp = SESSION.get(url, timeout=30)
+        resp.raise_for_status()
         # Format: MD5(filename)= <hash>
-        match = re.search(r'=\s*([a-f0-9]{32})', content)
-        if match:
-            return match.group(1)
+        match = _MD5_RE.search(resp.content.decode("utf-8"))
+        if not match:
+            raise ValueError("unrecognised checksum file")
+        return match.group(1)
+
+    try:
+        return get_or_fetch(f"pubmed:md5:{url}", fetch)
     except Exception as e:
         log.warning("Could not fetch MD5 for %s: %s", filename, e)
     return None
 
 
-def verify_file(filepath: Path, expected_md5: str) -> bool:
-    """Verify file MD5 checksum."""
-    md5 = hashlib.md5()
-    with open(filepath, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            md5.update(chunk)
-    actual = md5.hexdigest()
-    if actual == expected_md5:
+def fetch_all_md5s(filenames: list[str], url_base: str, jobs: int = MD5_JOBS) -> dict[str, str]:
+    """Published MD5s for filenames, fetched concurrently. Missing ones are left out."""
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        found = pool.map(lambda f: download_md5(f, url_base), filenames)
+        return {f: md5 for f, md5 in zip(filenames, found) if md5}
+
+
+def check_md5(filepath: Path, actual: bytes, expected_md5: str) -> bool:
+    """Compare a computed MD5 digest against the published hex one."""
+    if actual == bytes.fromhex(expected_md5):
         log.info("MD5 OK: %s", filepath.name)
         return True
     else:
-        log.error("MD5 MISMATCH: %s (expected %s, got %s)", filepath.name, expected_md5, actual)
+        log.error("MD5 MISMATCH: %s (expected %s, got %s)", filepath.name, expected_md5, actual.hex())
         return False
 
 
-def _human_size(nbytes: int) -> str:
-    for unit in ("B", "KB", "MB", "GB", "TB"):
-        if nbytes < 1024:
-            return f"{nbytes:.1f} {unit}"
-        nbytes /= 1024
-    return f"{nbytes:.1f} PB"
+def _file_digest(filepath: Path, new):
+    """Hash a file with the hash constructor `new`; returns the hash object.
+
+    The file is read once and not again soon, so readahead is widened for
+    the pass and its pages are dropped from the cache afterwards.
+    """
+    with open(filepath, "rb") as f:
+        fadvise = getattr(os, "posix_fadvise", None)
+        if fadvise:
+            fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        if hasattr(hashlib, "file_digest"):  # 3.11+: read/update loop runs in C
+            h = hashlib.file_digest(f, new)
+        else:
+            h = new()
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        if fadvise:
+            fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        return h
+
+
+class _Tee:
+    """Feeds one stream of chunks to several hash objects."""
+
+    def __init__(self, *hashers):
+        self.hashers = hashers
+
+    def update(self, data):
+        for h in self.hashers:
+            h.update(data)
+
+
+def _quick_path(filepath: Path) -> Path:
+    return filepath.with_name(filepath.name + QUICK_SUFFIX)
+
+
+def quick_verify(filepath: Path) -> bool | None:
+    """Check a file against its local fast-hash sidecar. None if there is none."""
+    try:
+        expected = bytes.fromhex(_quick_path(filepath).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    if _file_digest(filepath, _quick_hash).digest() == expected:
+        log.info("%s OK: %s", QUICK_SUFFIX[1:].upper(), filepath.name)
+        return True
+    log.error("%s MISMATCH: %s", QUICK_SUFFIX[1:].upper(), filepath.name)
+    return False
 
 
 def _file_number(filename: str) -> int:
     """Extract the file number from pubmed26n0001.xml.gz -> 1."""
-    match = re.search(r'n(\d+)\.xml\.gz', filename)
+    match = _FILE_NUM_RE.search(filename)
     return int(match.group(1)) if match else 0
 
 
+def fetch_file(filename: str, url_base: str, dest_dir: Path, verify: bool,
+               quick: bool = False, existing: set[str] | None = None,
+               expected_md5: str | None = None) -> str:
+    """Download one file and optionally check it against expected_md5.
+
+    New downloads are hashed as they land; only files that were already on
+    disk are read back to verify. With quick, files that passed before are
+    checked against their local fast-hash sidecar instead, and every file
+    that passes MD5 gets one. Returns "failed", "downloaded" or "verified".
+    """
+    if not verify:
+        dest = download_file(filename, url_base, dest_dir, existing=existing)
+        return "downloaded" if dest else "failed"
+
+    path = dest_dir / filename
+    existed = filename in existing if existing is not None else path.exists()
+    if existed and quick:
+        ok = quick_verify(path)
+        if ok is not None:
+            return "verified" if ok else _discard(path)
+
+    md5 = hashlib.md5()
+    fast = _quick_hash() if quick else None
+    hasher = _Tee(md5, fast) if fast else md5
+    if existed:
+        dest = path
+        if expected_md5:
+            _file_digest(path, lambda: hasher)
+    else:
+        dest = download_file(filename, url_base, dest_dir, hasher=hasher, existing=existing)
+        if not dest:
+            return "failed"
+    if not expected_md5:
+        return "downloaded"
+    if check_md5(dest, md5.digest(), expected_md5):
+        if quick:
+            _quick_path(dest).write_text(fast.hexdigest())
+        return "verified"
+    return _discard(dest)
+
+
+def aria2c_download(filenames: list[str], url_base: str, dest_dir: Path, jobs: int) -> bool:
+    """Download filenames with aria2c: segmented, many files in flight, one process.
+
+    aria2c leaves a <name>.aria2 control file next to anything it didn't
+    finish, which complete_names() uses to tell partial files apart.
+    Returns False if aria2c reported any failure.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as url_list:
+        url_list.writelines(f"{url_base}{f}\n" for f in filenames)
+        url_list.flush()
+        result = subprocess.run([
+            "aria2c", f"--max-concurrent-downloads={jobs}",
+            f"--max-connection-per-server={ARIA2_SPLIT}", f"--split={ARIA2_SPLIT}",
+            "--continue=true", "--auto-file-renaming=false",
+            "--user-agent=corpus-data-stager/1.0", "--console-log-level=warn",
+            "--dir", str(dest_dir), "--input-file", url_list.name,
+        ])
+    return result.returncode == 0
+
+
+def complete_names(dest_dir: Path) -> set[str]:
+    """Names in dest_dir, minus files aria2c left unfinished."""
+    names = existing_names(dest_dir)
+    return names - {n.removesuffix(".aria2") for n in names if n.endswith(".aria2")}
+
+
+def _discard(path: Path) -> str:
+    log.error("Checksum failed, removing: %s", path.name)
+    path.unlink(missing_ok=True)
+    _quick_path(path).unlink(missing_ok=True)
+    return "failed"
+
+
 def main():
     parser = argparse.ArgumentParser(description="PubMed/MEDLINE abstracts downloader")
     parser.add_argument("--list", action="store_true", help="List available files and exit")
     parser.add_argument("--updates", action="store_true", help="Download update files instead of baseline")
     parser.add_argument("--verify", action="store_true", help="Verify MD5 checksums of downloaded files")
+    parser.add_argument("--quick", action="store_true",
+                        help="With --verify, re-check previously verified files against a "
+                             "local BLAKE3 sidecar instead of upstream MD5")
     parser.add_argument("--range", nargs=2, type=int, metavar=("START", "END"),
                         help="Download only file numbers in this range (inclusive)")
+    parser.add_argument("--jobs", type=int, default=DOWNLOAD_JOBS,
+                        help=f"Concurrent downloads (default: {DOWNLOAD_JOBS})")
+    parser.add_argument("--aria2c", action="store_true",
+                        help="Download missing files with aria2c first; the Python path then "
+                             "verifies and retries whatever it missed")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be downloaded")
     args = parser.parse_args()
+    if args.aria2c and not shutil.which("aria2c"):
+        parser.error("--aria2c given but aria2c is not on PATH")
 
     LOG_DIR.mkdir(parents=True, exist_ok=True)
     STORAGE_DIR.mkdir(parents=True, exist_ok=True)
@@ -158,24 +341,33 @@ def main():
         print(f"\nTotal: {len(all_files)} files")
         return
 
+    if args.aria2c:
+        existing = complete_names(STORAGE_DIR)
+        pending = [f for f in all_files if f not in existing]
+        log.info("aria2c: downloading %d files", len(pending))
+        if pending and not aria2c_download(pending, url_base, STORAGE_DIR, args.jobs):
+            log.warning("aria2c reported failures; retrying the missing files over HTTP")
+
     downloaded = 0
     failed = 0
     verified = 0
-    for filename in all_files:
-        dest = download_file(filename, url_base, STORAGE_DIR)
-        if dest:
-            downloaded += 1
-            if args.verify:
-                expected_md5 = download_md5(filename, url_base, STORAGE_DIR)
-                if expected_md5 and verify_file(dest, expected_md5):
-                    verified += 1
-                elif expected_md5:
-                    log.error("Checksum failed, removing: %s", filename)
-                    dest.unlink(missing_ok=True)
-                    failed += 1
-                    downloaded -= 1
-        else:
-            failed += 1
+    md5s = {}
+    if args.verify:
+        md5s = fetch_all_md5s(all_files, url_base)
+        log.info("Fetched %d/%d published MD5s", len(md5s), len(all_files))
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        existing = complete_names(STORAGE_DIR)
+        futures = [pool.submit(fetch_file, f, url_base, STORAGE_DIR, args.verify, args.quick,
+                               existing, md5s.get(f))
+                   for f in all_files]
+        for future in as_completed(futures):
+            status = future.result()
+            if status == "failed":
+                failed += 1
+            else:
+                downloaded += 1
+                verified += status == "verified"
 
     log.info("Done. Downloaded: %d, Failed: %d, Verified: %d, Total: %d",
              downloaded, failed, verified, len(all_files))
@@ -9,26 +9,49 @@ Usage:
     python stage.py                    # Download all sites
     python stage.py --list             # List available sites
     python stage.py --sites aviation   # Download specific site(s)
-    python stage.py --extract          # Extract after downloading
+    python stage.py --extract          # Extract after downloading (archives then removed)
+    python stage.py --extract --keep-archive   # Extract and keep the .7z files
     python stage.py --skip-meta        # Skip .meta. sites
+    python stage.py --jobs 4           # Concurrent downloads (default 8)
 """
 
 import argparse
 import logging
 import os
 import re
+import shutil
 import subprocess
 import sys
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import requests
+from requests.adapters import HTTPAdapter
+
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import existing_names, human_size, open_listing, stream_download, stream_hrefs
 from config import storage_dir, log_dir
 
+# In-process extraction when py7zr is installed (no 7z fork per archive),
+# otherwise the 7z command-line tool
+try:
+    import py7zr
+except ImportError:
+    py7zr = None
+
 ARCHIVE_URL = "https://archive.org/download/stackexchange/"
 STORAGE_DIR = storage_dir("stackexchange")
 LOG_DIR = log_dir()
 
+# archive.org serves each file slowly, so several downloads run at once;
+# LZMA decoding is CPU-bound, so extraction gets its own pool, one per core
+DOWNLOAD_JOBS = 8
+EXTRACT_JOBS = os.cpu_count() or 2
+
+# Written into a site's directory once its archive is fully extracted, so
+# the archive can be deleted without the next run downloading it again
+EXTRACTED_MARKER = ".extracted"
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -39,73 +62,102 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+# One keep-alive pool shared by every download thread (no per-file
+# process spawn, DNS lookup or TLS handshake)
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "corpus-data-stager/1.0",
+                        # Archives are already compressed; keep the bytes as published
+                        "Accept-Encoding": "identity"})
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
 
 def list_available_sites() -> list[str]:
     """Scrape archive.org listing for all .7z files."""
     log.info("Fetching site list from %s", ARCHIVE_URL)
-    req = urllib.request.Request(ARCHIVE_URL, headers={"User-Agent": "corpus-data-stager/1.0"})
-    with urllib.request.urlopen(req) as resp:
-        html = resp.read().decode("utf-8")
-    files = re.findall(r'href="([^"]+\.7z)"', html)
+    with open_listing(ARCHIVE_URL, {"User-Agent": "corpus-data-stager/1.0"}) as resp:
+        files = stream_hrefs(resp, lambda href: href.endswith(".7z"))
     return sorted(files)
 
 
-def download_file(filename: str, dest_dir: Path) -> Path:
-    """Download a single .7z file from archive.org using curl."""
+def download_file(filename: str, dest_dir: Path, existing: set[str] | None = None) -> Path:
+    """Download a single .7z file from archive.org.
+
+    existing, if given, is the set of names already in dest_dir and
+    replaces the per-file stat.
+    """
     dest = dest_dir / filename
-    if dest.exists():
+    if filename in existing if existing is not None else dest.exists():
         log.info("Already exists, skipping: %s", dest)
         return dest
 
     url = ARCHIVE_URL + filename
     log.info("Downloading %s", url)
-    result = subprocess.run(
-        ["curl", "-L", "-o", str(dest), "--progress-bar", url],
-        check=False,
-    )
-    if result.returncode != 0:
-        log.error("Failed to download %s (exit code %d)", filename, result.returncode)
-        dest.unlink(missing_ok=True)
+    try:
+        stream_download(SESSION, url, dest)
+    except (requests.RequestException, OSError) as e:
+        log.error("Failed to download %s: %s", filename, e)
         return None
-    log.info("Downloaded %s (%s)", filename, _human_size(dest.stat().st_size))
+    log.info("Downloaded %s (%s)", filename, human_size(dest.stat().st_size))
     return dest
 
 
-def extract_file(archive: Path, dest_dir: Path) -> bool:
-    """Extract a .7z archive into a named subdirectory."""
+def is_extracted(filename: str, dest_dir: Path) -> bool:
+    """Whether an archive's contents were fully extracted by an earlier run."""
+    return (dest_dir / Path(filename).stem / EXTRACTED_MARKER).exists()
+
+
+def extract_file(archive: Path, dest_dir: Path, keep_archive: bool = True) -> bool:
+    """Extract a .7z archive into a named subdirectory.
+
+    Unless keep_archive, the archive is deleted once extraction succeeds.
+    Only EXTRACTED_MARKER counts as done; a directory without it is left
+    over from an interrupted extraction and is wiped and extracted again.
+    """
     site_name = archive.stem  # e.g. aviation.stackexchange.com
     extract_to = dest_dir / site_name
-    if extract_to.exists() and any(extract_to.iterdir()):
+    if is_extracted(archive.name, dest_dir):
         log.info("Already extracted, skipping: %s", extract_to)
+        if not keep_archive:
+            archive.unlink(missing_ok=True)
         return True
+    if extract_to.exists():
+        log.info("Removing incomplete extraction: %s", extract_to)
+        shutil.rmtree(extract_to)
 
     extract_to.mkdir(parents=True, exist_ok=True)
     log.info("Extracting %s -> %s", archive.name, extract_to)
-    result = subprocess.run(
-        ["7z", "x", "-y", f"-o{extract_to}", str(archive)],
-        capture_output=True,
-        text=True,
-    )
-    if result.returncode != 0:
-        log.error("Extraction failed for %s: %s", archive.name, result.stderr)
-        return False
+    if py7zr is not None:
+        try:
+            with py7zr.SevenZipFile(archive, "r") as z:
+                z.extractall(path=extract_to)
+        except Exception as e:
+            log.error("Extraction failed for %s: %s", archive.name, e)
+            return False
+    else:
+        result = subprocess.run(
+            ["7z", "x", "-y", f"-o{extract_to}", str(archive)],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            log.error("Extraction failed for %s: %s", archive.name, result.stderr)
+            return False
+    (extract_to / EXTRACTED_MARKER).touch()
+    if not keep_archive:
+        archive.unlink()
     return True
 
 
-def _human_size(nbytes: int) -> str:
-    for unit in ("B", "KB", "MB", "GB", "TB"):
-        if nbytes < 1024:
-            return f"{nbytes:.1f} {unit}"
-        nbytes /= 1024
-    return f"{nbytes:.1f} PB"
-
-
 def main():
     parser = argparse.ArgumentParser(description="StackExchange data dump downloader")
     parser.add_argument("--list", action="store_true", help="List available sites and exit")
     parser.add_argument("--sites", nargs="+", help="Download only these sites (partial match)")
     parser.add_argument("--extract", action="store_true", help="Extract .7z files after download")
+    parser.add_argument("--keep-archive", action="store_true",
+                        help="With --extract, keep each .7z after extracting it")
     parser.add_argument("--skip-meta", action="store_true", help="Skip .meta. sites")
+    parser.add_argument("--jobs", type=int, default=DOWNLOAD_JOBS,
+                        help=f"Concurrent downloads (default: {DOWNLOAD_JOBS})")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be downloaded")
     args = parser.parse_args()
 
@@ -120,11 +172,9 @@ def main():
         log.info("After filtering meta sites: %d archives", len(all_files))
 
     if args.sites:
-        filtered = []
-        for pattern in args.sites:
-            matches = [f for f in all_files if pattern.lower() in f.lower()]
-            filtered.extend(matches)
-        all_files = sorted(set(filtered))
+        # One case-insensitive alternation instead of a scan per pattern
+        sites_re = re.compile("|".join(map(re.escape, args.sites)), re.IGNORECASE)
+        all_files = [f for f in all_files if sites_re.search(f)]
         log.info("Filtered to %d archives matching: %s", len(all_files), args.sites)
 
     if args.list:
@@ -139,18 +189,46 @@ def main():
         print(f"\nTotal: {len(all_files)} archives")
         return
 
+    # Extracted sites may have had their archive deleted; don't fetch it
+    # again whether or not this run extracts
+    done = {f for f in all_files if is_extracted(f, STORAGE_DIR)}
+    if done:
+        log.info("Already extracted, skipping %d archives", len(done))
+        all_files = [f for f in all_files if f not in done]
+
     downloaded = 0
     failed = 0
-    for filename in all_files:
-        dest = download_file(filename, STORAGE_DIR)
-        if dest:
-            downloaded += 1
-            if args.extract:
-                extract_file(dest, STORAGE_DIR)
-        else:
-            failed += 1
+    extractions = {}
+    # Archives are extracted as soon as they land, while later ones download
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool, \
+            ThreadPoolExecutor(max_workers=EXTRACT_JOBS) as extract_pool:
+        existing = existing_names(STORAGE_DIR)
+        futures = [pool.submit(download_file, f, STORAGE_DIR, existing) for f in all_files]
+        for future in as_completed(futures):
+            dest = future.result()
+            if dest:
+                downloaded += 1
+                if args.extract:
+                    extractions[extract_pool.submit(
+                        extract_file, dest, STORAGE_DIR, args.keep_archive)] = dest.name
+            else:
+                failed += 1
+
+        extracted = extract_failed = 0
+        for future in as_completed(extractions):
+            try:
+                ok = future.result()
+            except Exception as e:
+                log.error("Extraction failed for %s: %s", extractions[future], e)
+                ok = False
+            if ok:
+                extracted += 1
+            else:
+                extract_failed += 1
 
     log.info("Done. Downloaded: %d, Failed: %d, Total: %d", downloaded, failed, len(all_files))
+    if args.extract:
+        log.info("Extracted: %d, Extraction failed: %d", extracted, extract_failed)
 
 
 if __name__ == "__main__":
@@ -23,18 +23,31 @@ Usage:
     python stage.py --product PTGRXML --limit 5        # Download latest 5 files
     python stage.py --product PTGRXML --year 2024      # Download files from a specific year
     python stage.py --product APPXML                   # Download patent applications
+    python stage.py --product PTGRXML --jobs 8         # Concurrent downloads (default 16)
+    python stage.py --product PTGRXML --refresh-cache  # Re-query cached API listings
+    python stage.py --product PTGRDT --range-parts 8   # Split each file across 8 ranges (default 4)
 """
 
 import argparse
+import functools
+import hashlib
 import json
 import logging
 import os
-import subprocess
+import shutil
+import socket
 import sys
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import (COPY_CHUNK, RANGE_STATE_SUFFIX, drop_page_cache, get_or_fetch, human_size,
+                    loads, ranged_download)
 from config import storage_dir, log_dir
 
 STORAGE_DIR = storage_dir("uspto")
@@ -43,6 +56,51 @@ LOG_DIR = log_dir()
 API_BASE = "https://api.uspto.gov/api/v1/datasets/products"
 API_KEY = os.environ.get("USPTO_API_KEY", "")
 
+# Bulk files downloaded concurrently over one keep-alive pool, and file
+# listing pages fetched at once after the first has given the total
+DOWNLOAD_JOBS = 16
+PAGE_JOBS = 8
+
+# HTTP Range requests each fresh download is split across; the big
+# tarballs are otherwise capped by what one TCP flow gets
+RANGE_PARTS = 4
+
+# Concurrent stat()s when checking which files are already complete; each
+# one is a round trip on NFS or FUSE-mounted storage
+STAT_JOBS = 32
+
+# Connections opened per download host before the fan-out, so the first
+# wave of downloads doesn't all wait on DNS and TLS handshakes at once
+WARM_CONNECTIONS = 4
+
+# File-list rows per API call. Most products fit in one large page; if the
+# API rejects the size (HTTP 400) the listing falls back to the old 100
+PAGE_SIZE = 1000
+FALLBACK_PAGE_SIZE = 100
+
+# (connect, read) timeouts for bulk files: fail fast on a dead host, but let
+# a slow multi-GB transfer stall for a while between chunks
+DOWNLOAD_TIMEOUT = (10, 300)
+
+# Read/write size for bulk files (multi-GB tarballs): fewer, larger syscalls
+DOWNLOAD_CHUNK = 4 << 20
+
+# API responses are cached (in the shared stage cache): the product list
+# changes rarely, and file lists only gain new files weekly
+PRODUCTS_TTL = 3600
+FILES_TTL = 86400
+
+# The only per-file fields used; file-list pages are trimmed to these
+# before they are cached or kept for the run
+FILE_FIELDS = ("fileName", "fileDownloadURI", "fileSize", "fileDataFromDate", "fileChecksum")
+
+# Completed downloads per product dir ({name: {size, checksum, mtime}}), so
+# a rerun skips them without a stat per file; delete it to force a re-check
+MANIFEST = "manifest.json"
+
+# Published checksums are hex digests; the algorithm follows from the length
+CHECKSUM_ALGORITHMS = {32: "md5", 40: "sha1", 64: "sha256"}
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -50,39 +108,225 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+# Added to API calls only; bulk downloads go out with the session defaults
+API_HEADERS = {"Accept": "application/json"}
 
-def _api_request(url: str) -> dict:
-    """Make an authenticated request to the USPTO ODP API."""
+# One keep-alive pool for API pagination and file downloads alike; the API
+# rate-limits with 429s, which the adapter retries with backoff
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "corpus-data-stager/1.0"})
+if API_KEY:
+    SESSION.headers["x-api-key"] = API_KEY
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=DOWNLOAD_JOBS * RANGE_PARTS,
+                                      max_retries=Retry(total=5, backoff_factor=0.5,
+                                                        status_forcelist=(429, 500, 502, 503, 504))))
+
+
+@functools.cache
+def _require_api_key():
+    """Exit unless USPTO_API_KEY is set; checked once, on the first uncached API call."""
     if not API_KEY:
         log.error("USPTO_API_KEY not set. Get one at https://data.uspto.gov/myodp/landing")
         sys.exit(1)
-    req = urllib.request.Request(url, headers={
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "x-api-key": API_KEY,
-        "User-Agent": "corpus-data-stager/1.0",
-    })
-    with urllib.request.urlopen(req, timeout=60) as resp:
-        return json.loads(resp.read())
 
 
-def list_products() -> list[dict]:
+def _api_request(url: str) -> dict:
+    """Make an authenticated request to the USPTO ODP API (key sent by SESSION)."""
+    _require_api_key()
+    resp = SESSION.get(url, headers=API_HEADERS, timeout=60)
+    resp.raise_for_status()
+    # Parse the body bytes directly: no charset sniffing or str copy of
+    # multi-MB file-list pages
+    return loads(resp.content)
+
+
+def _api_request_cached(url: str, ttl: float, refresh: bool = False) -> dict:
+    """_api_request through the stage cache; refresh bypasses it."""
+    return get_or_fetch(f"uspto:{url}", lambda: _api_request(url), ttl=ttl, refresh=refresh)
+
+
+def list_products(refresh: bool = False) -> list[dict]:
     """List all available bulk data products."""
-    data = _api_request(f"{API_BASE}/search?latest=true&limit=50")
+    data = _api_request_cached(f"{API_BASE}/search?latest=true&limit=50", PRODUCTS_TTL, refresh)
     return data.get("bulkDataProductBag", [])
 
 
-def get_product_files(product_id: str, offset: int = 0, limit: int = 100) -> dict:
-    """Get file listing for a specific product."""
-    data = _api_request(f"{API_BASE}/{product_id}?offset={offset}&limit={limit}")
-    products = data.get("bulkDataProductBag", [])
-    if not products:
+def get_product_files(product_id: str, offset: int = 0, limit: int = 100,
+                      refresh: bool = False, year: int | None = None) -> dict:
+    """Get file listing for a specific product (file entries trimmed to FILE_FIELDS).
+
+    With year, the API only returns files whose data falls in that year.
+    """
+    url = f"{API_BASE}/{product_id}?offset={offset}&limit={limit}"
+    if year:
+        url += f"&fileDataFromDate={year}-01-01&fileDataToDate={year}-12-31"
+
+    def fetch():
+        products = _api_request(url).get("bulkDataProductBag", [])
+        if not products:
+            return {}
+        product = products[0]
+        bag = product.get("productFileBag", {})
+        bag["fileDataBag"] = [{k: f[k] for k in FILE_FIELDS if k in f}
+                              for f in bag.get("fileDataBag", [])]
+        return product
+
+    return get_or_fetch(f"uspto:files:{url}", fetch, ttl=FILES_TTL, refresh=refresh)
+
+
+def get_all_product_files(product_id: str, page_size: int = PAGE_SIZE,
+                          refresh: bool = False, year: int | None = None) -> tuple[dict, list[dict]]:
+    """Product metadata and its full file list ({} and [] if it doesn't exist).
+
+    The first page gives the file count; the remaining pages are then
+    fetched concurrently and joined in offset order.
+    """
+    try:
+        product = get_product_files(product_id, offset=0, limit=page_size, refresh=refresh,
+                                    year=year)
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 400 or page_size <= FALLBACK_PAGE_SIZE:
+            raise
+        log.info("Page size %d rejected, using %d", page_size, FALLBACK_PAGE_SIZE)
+        return get_all_product_files(product_id, FALLBACK_PAGE_SIZE, refresh, year)
+    if not product:
+        return {}, []
+    bag = product.get("productFileBag", {})
+    files = list(bag.get("fileDataBag", []))
+    total = bag.get("count", 0)
+    if files and total > len(files):
+        offsets = range(len(files), total, page_size)
+        with ThreadPoolExecutor(max_workers=PAGE_JOBS) as pool:
+            pages = pool.map(lambda o: get_product_files(product_id, offset=o, limit=page_size,
+                                                         refresh=refresh, year=year),
+                             offsets)
+            for page in pages:
+                files.extend(page.get("productFileBag", {}).get("fileDataBag", []))
+    return product, files
+
+
+def load_manifest(dest_dir: Path) -> dict:
+    """Completed downloads recorded in dest_dir ({} if there is no manifest yet)."""
+    try:
+        return loads((dest_dir / MANIFEST).read_bytes())
+    except (FileNotFoundError, ValueError):
         return {}
-    return products[0]
 
 
-def download_file(file_info: dict, dest_dir: Path) -> Path | None:
-    """Download a single file from the ODP API."""
+def save_manifest(dest_dir: Path, manifest: dict):
+    """Write the manifest atomically (a crash leaves the previous one intact)."""
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    tmp = dest_dir / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, separators=(",", ":")))
+    os.replace(tmp, dest_dir / MANIFEST)
+
+
+def record_complete(manifest: dict, file_info: dict, path: Path):
+    """Add a completed file to the manifest (in memory; see save_manifest)."""
+    st = path.stat()
+    manifest[path.name] = {"size": st.st_size, "checksum": file_info.get("fileChecksum"),
+                           "mtime": int(st.st_mtime)}
+
+
+def is_complete(file_info: dict, dest_dir: Path) -> bool:
+    """Whether a listed file is already on disk at its listed size."""
+    try:
+        return (dest_dir / file_info["fileName"]).stat().st_size == file_info.get("fileSize", 0)
+    except FileNotFoundError:
+        return False
+
+
+def warm_up(files: list[dict], connections: int = WARM_CONNECTIONS):
+    """Resolve every download host and open a few pooled connections to each.
+
+    The HEAD requests leave keep-alive connections (TLS already negotiated)
+    in the session pool for the downloads to reuse. Failures are only
+    logged; the downloads report their own errors.
+    """
+    uris = {}
+    for f in files:
+        if f.get("fileDownloadURI"):
+            uris.setdefault(urlsplit(f["fileDownloadURI"]).hostname, f["fileDownloadURI"])
+    if not uris:
+        return
+
+    def prime(uri: str):
+        try:
+            SESSION.head(uri, timeout=DOWNLOAD_TIMEOUT[0], allow_redirects=True).close()
+        except requests.RequestException as e:
+            log.debug("Warm-up request to %s failed: %s", uri, e)
+
+    with ThreadPoolExecutor(max_workers=len(uris) * connections) as pool:
+        try:
+            list(pool.map(lambda host: socket.getaddrinfo(host, 443, type=socket.SOCK_STREAM),
+                          uris))
+        except OSError as e:
+            log.warning("DNS lookup failed: %s", e)
+        list(pool.map(prime, [uri for uri in uris.values() for _ in range(connections)]))
+    log.info("Warmed %d connection(s) to %s", len(uris) * connections, ", ".join(uris))
+
+
+def verify_checksum(path: Path, expected: str) -> bool | None:
+    """Check a file against its listed hex checksum (None if it can't be checked).
+
+    Runs in the download thread, so one file is hashed while the others
+    keep downloading; hashlib uses OpenSSL's SHA-NI/AVX2 code where the CPU
+    has it.
+    """
+    algorithm = CHECKSUM_ALGORITHMS.get(len(expected))
+    if not algorithm:
+        return None
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):  # 3.11+: read/update loop runs in C
+            h = hashlib.file_digest(f, algorithm)
+        else:
+            h = hashlib.new(algorithm)
+            for chunk in iter(lambda: f.read(COPY_CHUNK), b""):
+                h.update(chunk)
+    return h.hexdigest() == expected.lower()
+
+
+def _download_ranged(file_info: dict, dest: Path, parts: int) -> Path | None:
+    """download_file over `parts` concurrent Range requests (common.ranged_download).
+
+    An interrupted transfer keeps <name>.part and its range sidecar, so the
+    next run fetches only the bytes still missing.
+    """
+    filename = dest.name
+    size = file_info.get("fileSize", 0)
+    checksum = file_info.get("fileChecksum") or ""
+    algorithm = CHECKSUM_ALGORITHMS.get(len(checksum))
+    hasher = hashlib.new(algorithm) if algorithm else None
+    try:
+        actual_size = ranged_download(SESSION, file_info["fileDownloadURI"], dest, parts,
+                                      DOWNLOAD_TIMEOUT, hasher,
+                                      headers={"Accept-Encoding": "identity"}, resume=True)
+    except (requests.RequestException, OSError) as e:
+        log.error("Failed to download %s: %s", filename, e)
+        return None
+
+    if size and actual_size != size:
+        log.error("Size mismatch for %s: expected %d, got %d", filename, size, actual_size)
+        dest.unlink()
+        return None
+    if hasher and hasher.hexdigest() != checksum.lower():
+        log.error("Checksum mismatch for %s", filename)
+        dest.unlink()
+        return None
+    drop_page_cache(dest)
+    log.info("Downloaded %s (%s)", filename, human_size(actual_size))
+    return dest
+
+
+def download_file(file_info: dict, dest_dir: Path, range_parts: int = RANGE_PARTS) -> Path | None:
+    """Download a single file from the ODP API.
+
+    The body goes to <name>.part, renamed into place once it matches the
+    listed size (and checksum, when the listing has one). A fresh download
+    is split across range_parts concurrent Range requests, and resumes
+    range by range. A .part from a single-stream transfer is resumed with
+    one Range request (restarted if the server answers with the whole file).
+    """
     filename = file_info["fileName"]
     uri = file_info["fileDownloadURI"]
     size = file_info.get("fileSize", 0)
@@ -93,32 +337,56 @@ def download_file(file_info: dict, dest_dir: Path) -> Path | None:
         return dest
 
     dest.parent.mkdir(parents=True, exist_ok=True)
-    log.info("Downloading %s (%s)", filename, _human_size(size))
-    result = subprocess.run(
-        ["curl", "-L", "-o", str(dest), "--progress-bar",
-         "-H", f"x-api-key: {API_KEY}", uri],
-        check=False,
-    )
-    if result.returncode != 0:
-        log.error("Failed to download %s", filename)
-        dest.unlink(missing_ok=True)
-        return None
-
-    actual_size = dest.stat().st_size
+    part = dest.with_name(filename + ".part")
+    have = part.stat().st_size if part.exists() else 0
+    state_path = part.with_name(part.name + RANGE_STATE_SUFFIX)
+    checksum = file_info.get("fileChecksum")
+    if have and have == size and not checksum and not state_path.exists():
+        # Possibly a preallocated ranged .part killed before its first write;
+        # with no checksum to prove otherwise, it can't be trusted as complete
+        log.info("Discarding unverifiable %s", part.name)
+        part.unlink()
+        have = 0
+    if range_parts > 1 and (not have or state_path.exists()):
+        log.info("%s %s (%s)", "Resuming" if have else "Downloading", filename, human_size(size))
+        return _download_ranged(file_info, dest, range_parts)
+
+    # Sizes are compared on disk, so take the bytes exactly as stored
+    headers = {"Accept-Encoding": "identity"}
+    if have and (not size or have < size):
+        headers["Range"] = f"bytes={have}-"
+        log.info("Resuming %s at %s of %s", filename, human_size(have), human_size(size))
+    else:
+        log.info("Downloading %s (%s)", filename, human_size(size))
+
+    if not size or have != size:
+        try:
+            with SESSION.get(uri, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as resp:
+                resp.raise_for_status()
+                mode = "ab" if resp.status_code == 206 else "wb"
+                with open(part, mode) as f:
+                    shutil.copyfileobj(resp.raw, f, DOWNLOAD_CHUNK)
+        except (requests.RequestException, OSError) as e:
+            # Keep the .part; the next run resumes from it
+            log.error("Failed to download %s: %s", filename, e)
+            return None
+
+    actual_size = part.stat().st_size
     if size and actual_size != size:
-        log.warning("Size mismatch for %s: expected %d, got %d", filename, size, actual_size)
-    log.info("Downloaded %s (%s)", filename, _human_size(actual_size))
+        log.error("Size mismatch for %s: expected %d, got %d", filename, size, actual_size)
+        part.unlink()
+        return None
+    if checksum and verify_checksum(part, checksum) is False:
+        log.error("Checksum mismatch for %s", filename)
+        part.unlink()
+        return None
+    os.replace(part, dest)
+    # Unpacked by a later stage, not reread now; don't let it evict hotter pages
+    drop_page_cache(dest)
+    log.info("Downloaded %s (%s)", filename, human_size(actual_size))
     return dest
 
 
-def _human_size(nbytes: int) -> str:
-    for unit in ("B", "KB", "MB", "GB", "TB"):
-        if nbytes < 1024:
-            return f"{nbytes:.1f} {unit}"
-        nbytes /= 1024
-    return f"{nbytes:.1f} PB"
-
-
 def main():
     parser = argparse.ArgumentParser(description="USPTO ODP bulk data downloader")
     parser.add_argument("--list-products", action="store_true",
@@ -131,6 +399,14 @@ def main():
                         help="Limit number of files to download (0 = all)")
     parser.add_argument("--year", type=int,
                         help="Filter files by year (based on file date)")
+    parser.add_argument("--jobs", type=int, default=DOWNLOAD_JOBS,
+                        help=f"Concurrent downloads (default: {DOWNLOAD_JOBS})")
+    parser.add_argument("--range-parts", type=int, default=RANGE_PARTS,
+                        help=f"Range requests per file, 1 to disable (default: {RANGE_PARTS})")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE,
+                        help=f"File-list rows per API call (default: {PAGE_SIZE})")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="Ignore cached API listings and query the ODP API again")
     parser.add_argument("--dry-run", action="store_true",
                         help="Show what would be downloaded")
     args = parser.parse_args()
@@ -144,7 +420,7 @@ def main():
     log.addHandler(fh)
 
     if args.list_products:
-        products = list_products()
+        products = list_products(args.refresh_cache)
         print(f"{'ID':12s} | {'Files':>6s} | {'Size':>10s} | Title")
         print("-" * 80)
         for p in products:
@@ -161,31 +437,18 @@ def main():
     dest_dir = STORAGE_DIR / product_id.lower()
 
     # Fetch all files with pagination
-    all_files = []
-    offset = 0
-    page_size = 100
-    while True:
-        product = get_product_files(product_id, offset=offset, limit=page_size)
-        if not product:
-            log.error("Product %s not found", product_id)
-            sys.exit(1)
-
-        bag = product.get("productFileBag", {})
-        files = bag.get("fileDataBag", [])
-        total = bag.get("count", 0)
-        all_files.extend(files)
-
-        if offset == 0:
-            log.info("Product: %s - %s", product_id, product.get("productTitleText", ""))
-            log.info("Total files: %d, Total size: %s",
-                     product.get("productFileTotalQuantity", 0),
-                     _human_size(product.get("productTotalFileSize", 0)))
-
-        if len(all_files) >= total or not files:
-            break
-        offset += page_size
+    product, all_files = get_all_product_files(product_id, args.page_size,
+                                               refresh=args.refresh_cache, year=args.year)
+    if not product:
+        log.error("Product %s not found", product_id)
+        sys.exit(1)
+    log.info("Product: %s - %s", product_id, product.get("productTitleText", ""))
+    log.info("Total files: %d, Total size: %s",
+             product.get("productFileTotalQuantity", 0),
+             human_size(product.get("productTotalFileSize", 0)))
 
-    # Filter by year if specified
+    # Filter by year if specified (the API already filters; this guards
+    # against it ignoring the date parameters)
     if args.year:
         year_str = str(args.year)
         all_files = [f for f in all_files
@@ -204,14 +467,39 @@ def main():
         print(f"\n{len(all_files)} files")
         return
 
+    # Skip files already complete: those in the manifest at their listed
+    # size, then the rest checked concurrently on disk (and recorded)
+    manifest = load_manifest(dest_dir)
+    listed = len(all_files)
+    all_files = [f for f in all_files
+                 if manifest.get(f["fileName"], {}).get("size") != f.get("fileSize", 0)]
+    with ThreadPoolExecutor(max_workers=STAT_JOBS) as pool:
+        complete = list(pool.map(lambda f: is_complete(f, dest_dir), all_files))
+    if any(complete):
+        for f, done in zip(all_files, complete):
+            if done:
+                record_complete(manifest, f, dest_dir / f["fileName"])
+        save_manifest(dest_dir, manifest)
+        all_files = [f for f, done in zip(all_files, complete) if not done]
+    skipped = listed - len(all_files)
+    if skipped:
+        log.info("Already complete, skipping %d files", skipped)
+
     # Download
-    total_downloaded = 0
+    warm_up(all_files, min(args.jobs, WARM_CONNECTIONS))
+    total_downloaded = skipped
     total_failed = 0
-    for f in all_files:
-        if download_file(f, dest_dir):
-            total_downloaded += 1
-        else:
-            total_failed += 1
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(download_file, f, dest_dir, args.range_parts): f
+                   for f in all_files}
+        for future in as_completed(futures):
+            path = future.result()
+            if path:
+                record_complete(manifest, futures[future], path)
+                save_manifest(dest_dir, manifest)
+                total_downloaded += 1
+            else:
+                total_failed += 1
 
     log.info("Done. Downloaded: %d, Failed: %d", total_downloaded, total_failed)
 
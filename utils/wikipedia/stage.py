@@ -1,13 +1,36 @@
 #!/usr/bin/env python3
+import os
+import shutil
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from config import storage_dir
 
-from datasets import load_dataset
+from datasets import load_dataset, load_from_disk
+
+# Parquet shards are downloaded and converted to Arrow in parallel processes
+NUM_PROC = min(16, os.cpu_count() or 1)
 
 dest = storage_dir("wikipedia")
+out_dir = dest / "hf_dataset"
+
+# A finished save is the deliverable; don't rebuild and rewrite it
+if (out_dir / "state.json").exists():
+    ds = load_from_disk(str(out_dir))
+    print(f"Already saved: {len(ds)} articles in {out_dir}")
+    sys.exit(0)
+
+cache_dir = dest / "hf_cache"
 ds = load_dataset("wikimedia/wikipedia", "20231101.en", split="train",
-                  cache_dir=str(dest / "hf_cache"))
-ds.save_to_disk(str(dest / "hf_dataset"))
-print(f"Done: {len(ds)} articles")
+                  cache_dir=str(cache_dir), num_proc=NUM_PROC)
+ds.save_to_disk(str(out_dir), num_proc=NUM_PROC)
+
+# The saved copy replaces the prepared dataset in the HF cache (the raw
+# downloads are kept), so it isn't stored twice. The whole config directory
+# goes, builder metadata included, so a later load_dataset re-prepares
+# instead of finding dataset_info.json without its Arrow shards.
+prepared = Path(ds.cache_files[0]["filename"]).resolve().parent.relative_to(cache_dir.resolve())
+articles = len(ds)
+del ds
+shutil.rmtree(cache_dir / prepared.parts[0] / prepared.parts[1])
+print(f"Done: {articles} articles")